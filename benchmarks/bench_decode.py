@@ -0,0 +1,141 @@
+"""
+Benchmark the response path: json decoding + building thumbs from a feed page.
+
+Usage:
+    PYTHONPATH=. python benchmarks/bench_decode.py [recorded_page.json ...]
+
+Recorded pages are raw graphql responses as returned by instagram (e.g. saved from a
+location feed). Without arguments a synthetic page of 50 nodes is used.
+
+The baseline is the previous response path: stdlib json, then the whole page converted
+to nested addict dicts (pip install addict to run it).
+"""
+
+import json
+import sys
+import timeit
+
+from instagram_is import InstagramIS
+from instagram_is.models import InstagramPostThumb
+from instagram_is.tools import (
+    _dig,
+    _json_loads,
+    _to_int,
+    _to_bool,
+    _timestamp_to_datetime,
+    _get_hashtags,
+    _get_mentions,
+)
+
+try:
+    from addict import Dict as Addict
+except ImportError:
+    Addict = None
+
+MEDIA_PATHS = (
+    ("data", "hashtag", "edge_hashtag_to_media"),
+    ("data", "location", "edge_location_to_media"),
+    ("data", "user", "edge_owner_to_timeline_media"),
+)
+
+
+def synthetic_page(num: int = 50) -> str:
+    caption = "sunset at the pier #beach #sunset @someone " * 10
+    node = {
+        "id": "1950000000000000000",
+        "owner": {"id": "123456789"},
+        "shortcode": "Bq1234567890",
+        "edge_media_to_caption": {"edges": [{"node": {"text": caption}}]},
+        "edge_media_to_comment": {"count": 12},
+        "edge_media_preview_like": {"count": 345},
+        "taken_at_timestamp": 1543770000,
+        "dimensions": {"height": 1080, "width": 1080},
+        "display_url": "https://scontent.cdninstagram.com/" + "x" * 200,
+        "thumbnail_resources": [
+            {"src": "https://scontent.cdninstagram.com/" + "y" * 200, "config_width": w}
+            for w in (150, 240, 320, 480, 640)
+        ],
+        "is_video": False,
+        "accessibility_caption": "Image may contain: sky, ocean, outdoor",
+        "comments_disabled": False,
+    }
+    media = {
+        "count": 1000000,
+        "page_info": {"has_next_page": True, "end_cursor": "QVFE" * 30},
+        "edges": [{"node": node} for _ in range(num)],
+    }
+    return json.dumps({"data": {"location": {"edge_location_to_media": media}}})
+
+
+def find_media(page: dict) -> dict:
+    for path in MEDIA_PATHS:
+        media = _dig(page, *path)
+        if media:
+            return media
+    raise ValueError("not a recorded feed page")
+
+
+def addict_node_to_post_thumb(data) -> InstagramPostThumb:
+    # InstagramIS._node_to_post_thumb before selective extraction
+    data = Addict(data)
+    try:
+        caption = data.edge_media_to_caption.edges[0].node.text or ""
+    except IndexError:
+        caption = ""
+    return InstagramPostThumb(
+        post_num_id=data.id,
+        owner_num_id=_to_int(data.owner.id),
+        caption=caption,
+        shortcode=data.shortcode or None,
+        comment_count=_to_int(data.edge_media_to_comment.count),
+        like_count=_to_int(data.edge_media_preview_like.count),
+        created_at=_timestamp_to_datetime(data.taken_at_timestamp),
+        img_height=_to_int(data.dimensions.height),
+        img_width=_to_int(data.dimensions.width),
+        img_url=data.display_url or None,
+        is_video=_to_bool(data.is_video),
+        hashtags=_get_hashtags(caption),
+        mentions=_get_mentions(caption),
+    )
+
+
+def addict_thumbs(raw: str):
+    page = json.loads(raw)
+    media = Addict(page)
+    for p in next(p for p in MEDIA_PATHS if _dig(page, *p)):
+        media = media[p]
+    return [addict_node_to_post_thumb(e.node) for e in media.edges]
+
+
+def thumbs(raw: str):
+    media = find_media(_json_loads(raw))
+    return [InstagramIS._node_to_post_thumb(e["node"]) for e in media["edges"]]
+
+
+def main(paths):
+    if paths:
+        pages = [open(p, encoding="utf-8").read() for p in paths]
+    else:
+        pages = [synthetic_page()]
+
+    benchmarks = [
+        ("stdlib json.loads", lambda: [json.loads(p) for p in pages]),
+        ("_json_loads", lambda: [_json_loads(p) for p in pages]),
+    ]
+    if Addict:
+        benchmarks.append(
+            ("baseline json + addict", lambda: [addict_thumbs(p) for p in pages])
+        )
+    else:
+        print("addict not installed, skipping baseline")
+    benchmarks.append(("_json_loads + thumbs", lambda: [thumbs(p) for p in pages]))
+
+    number = 200
+    for name, fxn in benchmarks:
+        seconds = min(timeit.repeat(fxn, number=number, repeat=5))
+        per_page = seconds / number / len(pages) * 1000
+        print(f"{name:<24} {per_page:8.3f} ms/page")
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,75 @@
+import hashlib
+import os
+import shutil
+from http.client import HTTPException, IncompleteRead
+from typing import Optional
+from urllib.error import HTTPError, URLError
+from urllib.parse import urlparse
+from urllib.request import Request, urlopen
+
+from backoff import on_exception, expo
+
+
+def media_file_path(directory: str, url: str, shortcode: Optional[str] = None) -> str:
+    """
+    Content-addressed location of a media file, so the same media is only stored once.
+    :param directory: where media is stored
+    :param url: media url, cdn urls are signed so only the path is used for hashing
+    :param shortcode: preferred file name, a hash of the url path is used otherwise
+    :return: file path
+    """
+    url_path = urlparse(url).path
+    ext = os.path.splitext(url_path)[1] or ".jpg"
+    name = shortcode or hashlib.sha1(url_path.encode("utf-8")).hexdigest()
+    return os.path.join(directory, name + ext)
+
+
+def _is_client_error(e: Exception) -> bool:
+    # e.g. expired cdn signatures, retrying will not help
+    return isinstance(e, HTTPError) and 400 <= e.code < 500
+
+
+# HTTPException covers truncated responses (IncompleteRead), which are then resumed
+@on_exception(
+    expo,
+    (URLError, ConnectionError, HTTPException, TimeoutError),
+    max_time=60,
+    giveup=_is_client_error,
+)
+def download_file(url: str, path: str, chunk_size: int = 64 * 1024) -> str:
+    """
+    Stream url to path without loading it in memory.
+    Existing files are skipped, partial downloads (path + '.part') are resumed.
+    :param url: file to download
+    :param path: where to save it
+    :param chunk_size: bytes written at a time
+    :return: path
+    """
+    if os.path.exists(path):
+        return path
+
+    part_path = path + ".part"
+    offset = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    headers = {"Range": f"bytes={offset}-"} if offset else {}
+    try:
+        response = urlopen(Request(url, headers=headers), timeout=60)
+    except HTTPError as e:
+        if e.code != 416:
+            raise
+        # range not satisfiable: the partial download is already complete
+        response = None
+
+    if response:
+        with response:
+            # servers that ignore the range header resend the whole file
+            mode = "ab" if response.status == 206 else "wb"
+            expected = int(response.headers.get("Content-Length") or 0)
+            with open(part_path, mode) as fh:
+                start = fh.tell()
+                shutil.copyfileobj(response, fh, chunk_size)
+                written = fh.tell() - start
+            if written < expected:
+                # reading a cut off response just ends early, resumed by the retry
+                raise IncompleteRead(b"", expected - written)
+    os.replace(part_path, path)
+    return path
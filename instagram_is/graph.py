@@ -0,0 +1,327 @@
+import json
+import os
+import struct
+import sys
+from array import array
+from bisect import bisect_left
+from heapq import merge
+from itertools import islice
+from typing import IO, Callable, Iterable, Iterator, NamedTuple, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # windows
+    fcntl = None
+    import msvcrt
+
+
+class VisitedIds:
+    """
+    Compact set of numeric ids, e.g. user ids.
+    Ids are kept in a sorted array (8 bytes per id) plus a small set of recent additions
+    which is merged into the array once it fills up. Python sets of strings would need
+    around ten times the memory.
+    """
+
+    # bytes per id on disk
+    itemsize = array("Q").itemsize
+
+    def __init__(self, ids: Iterable[int] = (), buffer_size: int = 100_000):
+        self._ids = array("Q", sorted(set(ids)))
+        self._buffer = set()
+        self.buffer_size = buffer_size
+
+    def __len__(self) -> int:
+        return len(self._ids) + len(self._buffer)
+
+    def __contains__(self, i: int) -> bool:
+        if i in self._buffer:
+            return True
+        pos = bisect_left(self._ids, i)
+        return pos < len(self._ids) and self._ids[pos] == i
+
+    def add(self, i: int) -> None:
+        if i in self:
+            return
+        self._buffer.add(i)
+        if len(self._buffer) >= self.buffer_size:
+            self._merge()
+
+    def _merge(self) -> None:
+        if self._buffer:
+            # stream the merge, a list of every id as python ints would not be compact
+            self._ids = array("Q", merge(self._ids, sorted(self._buffer)))
+            self._buffer = set()
+
+    def save(self, path: str) -> None:
+        self._merge()
+        with open(path, "wb") as fh:
+            self._ids.tofile(fh)
+            fh.flush()
+            os.fsync(fh.fileno())
+
+    @classmethod
+    def load(cls, path: str, **kwargs) -> "VisitedIds":
+        visited = cls(**kwargs)
+        with open(path, "rb") as fh:
+            visited._ids.fromfile(fh, os.path.getsize(path) // visited._ids.itemsize)
+        return visited
+
+
+class DiskFrontier:
+    """
+    FIFO queue of (id, depth) kept in an append-only file, so that the frontier of a
+    large crawl does not have to fit in memory. Only the read offset is held in memory.
+    """
+
+    _record = struct.Struct("<QH")
+
+    def __init__(self, path: str, read_offset: int = 0, size: Optional[int] = None):
+        mode = "r+b" if os.path.exists(path) else "w+b"
+        self._fh = open(path, mode)
+        if size is not None:
+            # drop anything pushed after the last checkpoint, it will be pushed again
+            self._fh.truncate(size)
+        self._fh.seek(0, os.SEEK_END)
+        self.size = self._fh.tell()
+        self.read_offset = read_offset
+
+    def __len__(self) -> int:
+        return (self.size - self.read_offset) // self._record.size
+
+    def push(self, i: int, depth: int) -> None:
+        self._fh.seek(self.size)
+        self._fh.write(self._record.pack(i, depth))
+        self.size += self._record.size
+
+    def pop(self) -> Tuple[int, int]:
+        if not len(self):
+            raise IndexError("pop from empty frontier")
+        self._fh.seek(self.read_offset)
+        record = self._record.unpack(self._fh.read(self._record.size))
+        self.read_offset += self._record.size
+        return record
+
+    def flush(self) -> None:
+        self._fh.flush()
+        os.fsync(self._fh.fileno())
+
+    def close(self) -> None:
+        self._fh.close()
+
+
+class IdLog:
+    """
+    Append-only file of ids, e.g. ids visited since the last snapshot of a VisitedIds.
+    Like DiskFrontier, only the size is held in memory and anything written after it is
+    dropped when reopening with a saved size.
+    """
+
+    _record = struct.Struct("<Q")
+
+    def __init__(self, path: str, size: Optional[int] = None):
+        mode = "r+b" if os.path.exists(path) else "w+b"
+        self._fh = open(path, mode)
+        if size is not None:
+            self._fh.truncate(size)
+        self._fh.seek(0, os.SEEK_END)
+        self.size = self._fh.tell()
+
+    def __len__(self) -> int:
+        return self.size // self._record.size
+
+    def __iter__(self) -> Iterator[int]:
+        self._fh.seek(0)
+        remaining = len(self)
+        while remaining:
+            chunk = array("Q")
+            chunk.fromfile(self._fh, min(remaining, 100_000))
+            remaining -= len(chunk)
+            yield from chunk
+        self._fh.seek(self.size)
+
+    def append(self, i: int) -> None:
+        self._fh.seek(self.size)
+        self._fh.write(self._record.pack(i))
+        self.size += self._record.size
+
+    def flush(self) -> None:
+        self._fh.flush()
+        os.fsync(self._fh.fileno())
+
+    def close(self) -> None:
+        self._fh.close()
+
+
+# the visited log is folded into a new snapshot once it outgrows both of these
+_COMPACT_MIN_BYTES = 1 << 20
+
+
+def _lock_dir(path: str) -> IO:
+    """
+    Take an exclusive lock on directory path, held until the returned file is closed.
+    """
+    fh = open(os.path.join(path, "lock"), "a+b")
+    try:
+        if fcntl:
+            fcntl.flock(fh.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            fh.seek(0)
+            msvcrt.locking(fh.fileno(), msvcrt.LK_NBLCK, 1)
+    except OSError:
+        fh.close()
+        raise RuntimeError(f"{path} is used by another crawl, stop it first") from None
+    return fh
+
+
+class GraphEdge(NamedTuple):
+    source_id: int
+    target_id: int
+    # depth of source_id, seeds are 0
+    depth: int
+
+
+def crawl_graph(
+    neighbours: Callable[[int, Optional[int]], Iterator[int]],
+    seeds: Iterable[int],
+    state_dir: str,
+    max_depth: int = 1,
+    max_fan_out: Optional[int] = None,
+    checkpoint_every: int = 100,
+) -> Iterator[GraphEdge]:
+    """
+    Breadth-first crawl, yielding every edge found.
+    The frontier lives on disk and the visited ids in a compact array; newly visited
+    ids are appended to a log on disk, which is folded into a snapshot of the array once
+    it grows larger than the snapshot. Both files are flushed to state_dir every
+    checkpoint_every nodes and when the crawl is stopped, so calling this again with the
+    same state_dir resumes the crawl (seeds are then ignored). Nodes since the last
+    checkpoint are crawled again, so their edges may be yielded twice.
+    state_dir is locked while the crawl runs, a second crawl of it raises RuntimeError
+    until the first one is stopped (closed) or done.
+
+    :param neighbours: fxn(node_id, max_results) returning ids connected to node_id
+    :param seeds: ids to start from, at depth 0
+    :param state_dir: where crawl state is saved
+    :param max_depth: hops away from the seeds that are crawled, 1 only crawls seeds
+    :param max_fan_out: most edges followed from a single node, None for all
+    :param checkpoint_every: how many nodes are crawled between saving state
+    :return: edges, in breadth-first order
+    """
+    os.makedirs(state_dir, exist_ok=True)
+    lock = _lock_dir(state_dir)
+    try:
+        yield from _crawl(
+            neighbours, seeds, state_dir, max_depth, max_fan_out, checkpoint_every
+        )
+    finally:
+        lock.close()
+
+
+def _crawl(
+    neighbours: Callable[[int, Optional[int]], Iterator[int]],
+    seeds: Iterable[int],
+    state_dir: str,
+    max_depth: int,
+    max_fan_out: Optional[int],
+    checkpoint_every: int,
+) -> Iterator[GraphEdge]:
+    state_path = os.path.join(state_dir, "state.json")
+    frontier_path = os.path.join(state_dir, "frontier.bin")
+
+    def state_file(name: str) -> str:
+        return os.path.join(state_dir, name)
+
+    def load_state() -> Optional[dict]:
+        if not os.path.exists(state_path):
+            return None
+        with open(state_path) as fh:
+            return json.load(fh)
+
+    state = load_state()
+
+    if state:
+        frontier = DiskFrontier(
+            frontier_path, read_offset=state["read_offset"], size=state["frontier_size"]
+        )
+        snapshot = state["visited"]
+        if snapshot:
+            visited = VisitedIds.load(state_file(f"visited-{snapshot}.bin"))
+        else:
+            visited = VisitedIds()
+        snapshot_bytes = len(visited) * VisitedIds.itemsize
+        visited_log = IdLog(
+            state_file(f"visited-{snapshot}.log"), size=state["visited_log_size"]
+        )
+        for i in visited_log:
+            visited.add(i)
+    else:
+        frontier = DiskFrontier(frontier_path, size=0)
+        visited = VisitedIds()
+        snapshot, snapshot_bytes = 0, 0
+        visited_log = IdLog(state_file("visited-0.log"), size=0)
+        for s in seeds:
+            if s not in visited:
+                visited.add(s)
+                visited_log.append(s)
+                frontier.push(s, 0)
+
+    def compact() -> None:
+        nonlocal snapshot, snapshot_bytes, visited_log
+        snapshot += 1
+        visited.save(state_file(f"visited-{snapshot}.bin"))
+        snapshot_bytes = len(visited) * VisitedIds.itemsize
+        visited_log.close()
+        visited_log = IdLog(state_file(f"visited-{snapshot}.log"), size=0)
+
+    def checkpoint() -> None:
+        old_snapshot = snapshot
+        if visited_log.size >= max(snapshot_bytes, _COMPACT_MIN_BYTES):
+            compact()
+        visited_log.flush()
+        frontier.flush()
+        tmp_path = state_path + ".tmp"
+        with open(tmp_path, "w") as fh:
+            json.dump(
+                {
+                    "visited": snapshot,
+                    "visited_log_size": visited_log.size,
+                    "read_offset": frontier.read_offset,
+                    "frontier_size": frontier.size,
+                },
+                fh,
+            )
+            fh.flush()
+            os.fsync(fh.fileno())
+        os.replace(tmp_path, state_path)
+        if snapshot != old_snapshot:
+            for name in (f"visited-{old_snapshot}.bin", f"visited-{old_snapshot}.log"):
+                if os.path.exists(state_file(name)):
+                    os.remove(state_file(name))
+
+    crawled = 0
+    node_offset = None
+    try:
+        checkpoint()
+        while len(frontier):
+            node_offset = frontier.read_offset
+            node_id, depth = frontier.pop()
+            for target_id in islice(neighbours(node_id, max_fan_out), max_fan_out):
+                yield GraphEdge(node_id, target_id, depth)
+                if depth + 1 < max_depth and target_id not in visited:
+                    visited.add(target_id)
+                    visited_log.append(target_id)
+                    frontier.push(target_id, depth + 1)
+            node_offset = None
+            crawled += 1
+            if crawled % checkpoint_every == 0:
+                checkpoint()
+    finally:
+        if node_offset is not None:
+            # stopped mid-node, crawl it again when resuming
+            frontier.read_offset = node_offset
+        # an abandoned stream may only be closed at exit, when files can't be written
+        if not sys.is_finalizing():
+            checkpoint()
+        frontier.close()
+        visited_log.close()
@@ -1,19 +1,53 @@
-from typing import Iterator, Union
+import threading
+from functools import partial
+from typing import Callable, Iterator, Optional, TypeVar, Union
 
-from addict import Dict as Addict
+from instagram_web_api.errors import ClientError
 from more_itertools import collapse
 
 from instagram_is.tools import (
+    _dig,
     _to_int,
     _to_bool,
     _timestamp_to_datetime,
     _get_caption,
     _get_hashtags,
     _get_mentions,
+    _post_id_to_shortcode,
+)
+from .graph import crawl_graph
+from .models import (
+    InstagramPostThumb,
+    InstagramUser,
+    InstagramPost,
+    InstagramComment,
+    InstagramUserThumb,
+    InstagramFollow,
+    InstagramMedia,
 )
-from .models import InstagramPostThumb, InstagramUser, InstagramPost, InstagramComment
 from .patches import CustomWebApiClient
-from .streams import ThumbStream, UserStream, PostStream
+from .streams import (
+    PagedFeed,
+    ThumbStream,
+    UserStream,
+    PostStream,
+    CommentStream,
+    UserThumbStream,
+    FollowStream,
+)
+
+ANY_USER = Union[
+    int,
+    str,
+    InstagramUser,
+    InstagramUserThumb,
+    InstagramPost,
+    InstagramPostThumb,
+    InstagramComment,
+    InstagramMedia,
+]
+
+T = TypeVar("T")
 
 
 class InstagramIS:
@@ -24,40 +58,93 @@ class InstagramIS:
 
     @classmethod
     def _node_to_post_thumb(cls, data: dict) -> InstagramPostThumb:
-        data = Addict(data)
+        # read only the fields we need straight from the decoded json, converting
+        # whole pages into nested attribute dicts cost more than the decoding itself
         caption = _get_caption(data)
         return InstagramPostThumb(
-            post_num_id=data.id,
-            owner_num_id=_to_int(data.owner.id),
+            post_num_id=data.get("id"),
+            owner_num_id=_to_int(_dig(data, "owner", "id")),
             caption=caption,
-            shortcode=data.shortcode or None,
-            comment_count=_to_int(data.edge_media_to_comment.count),
-            like_count=_to_int(data.edge_media_preview_like.count),
-            created_at=_timestamp_to_datetime(data.taken_at_timestamp),
-            img_height=_to_int(data.dimensions.height),
-            img_width=_to_int(data.dimensions.width),
-            img_url=data.display_url or None,
-            is_video=_to_bool(data.is_video),
+            shortcode=data.get("shortcode") or None,
+            comment_count=_to_int(_dig(data, "edge_media_to_comment", "count")),
+            like_count=_to_int(_dig(data, "edge_media_preview_like", "count")),
+            created_at=_timestamp_to_datetime(data.get("taken_at_timestamp")),
+            img_height=_to_int(_dig(data, "dimensions", "height")),
+            img_width=_to_int(_dig(data, "dimensions", "width")),
+            img_url=data.get("display_url") or None,
+            is_video=_to_bool(data.get("is_video")),
             hashtags=_get_hashtags(caption),
             mentions=_get_mentions(caption),
         )
 
-    def _paginate_thumb_feed(
-        self, feed_name: str, feed_kwargs: dict, media_path: Iterator[str]
-    ) -> Iterator[InstagramPostThumb]:
+    @classmethod
+    def _node_to_comment(cls, data: dict, post_shortcode: str) -> InstagramComment:
+        text = data.get("text") or ""
+        return InstagramComment(
+            comment_id=_to_int(data.get("id")),
+            post_shortcode=post_shortcode,
+            text=text,
+            created_at=_timestamp_to_datetime(data.get("created_at")),
+            owner_id=_to_int(_dig(data, "owner", "id")),
+            owner_username=_dig(data, "owner", "username") or None,
+            owner_profile_pic_url=_dig(data, "owner", "profile_pic_url") or None,
+            hashtags=_get_hashtags(text),
+            mentions=_get_mentions(text),
+        )
+
+    @classmethod
+    def _node_to_user_thumb(cls, data: dict) -> InstagramUserThumb:
+        return InstagramUserThumb(
+            user_id=_to_int(data.get("id")),
+            username=data.get("username") or None,
+            full_name=data.get("full_name") or None,
+            profile_pic_url=data.get("profile_pic_url") or None,
+            is_verified=_to_bool(data.get("is_verified")),
+        )
+
+    def _paginate_feed(
+        self,
+        feed_name: str,
+        feed_kwargs: dict,
+        media_path: Iterator[str],
+        node_to_model: Callable[[dict], T],
+        max_results: Optional[int] = None,
+        stop: Optional[threading.Event] = None,
+    ) -> Iterator[T]:
+        """
+
+        :param node_to_model: converts each node of the feed's edges
+        :param max_results: set by the stream planner, the most elements that will be
+            consumed from this feed; the last pages requested are made smaller to fit
+        :param stop: set by the stream planner once the stream is closed, no further
+            pages are requested (feeds may be read by worker threads)
+        """
         has_next_page = True
         end_cursor = None
-        while has_next_page:
-            r = getattr(self._web_api_client, feed_name)(
-                **feed_kwargs, end_cursor=end_cursor
-            )
-            media = Addict(r)
-            for p in media_path:
-                media = media[p]
-            has_next_page = media.page_info.has_next_page
-            end_cursor = media.page_info.end_cursor
-            for edge in media.edges:
-                yield self._node_to_post_thumb(edge.node)
+        remaining = max_results
+        while has_next_page and (remaining is None or remaining > 0):
+            if stop and stop.is_set():
+                return
+            count = feed_kwargs["count"]
+            if remaining is not None:
+                count = min(count, remaining)
+            try:
+                r = getattr(self._web_api_client, feed_name)(
+                    **{**feed_kwargs, "count": count}, end_cursor=end_cursor
+                )
+            except ClientError as e:
+                # deleted/private media or users, don't stop the other muxed feeds
+                if e.code == 404:
+                    return
+                raise
+            media = _dig(r, *media_path, default={})
+            has_next_page = _dig(media, "page_info", "has_next_page")
+            end_cursor = _dig(media, "page_info", "end_cursor")
+            edges = media.get("edges") or ()
+            if remaining is not None:
+                remaining -= len(edges)
+            for edge in edges:
+                yield node_to_model(edge["node"])
 
     def tag_feed(
         self, *tags: Union[str, Iterator[str]]
@@ -66,8 +153,19 @@ class InstagramIS:
         tags = collapse(tags)
         params = ({"tag": t, "count": 50} for t in tags)
         media_path = ("data", "hashtag", "edge_hashtag_to_media")
-        feeds = (self._paginate_thumb_feed("tag_feed", p, media_path) for p in params)
-        return ThumbStream(*feeds)
+        feeds = (
+            PagedFeed(
+                partial(
+                    self._paginate_feed,
+                    "tag_feed",
+                    p,
+                    media_path,
+                    self._node_to_post_thumb,
+                )
+            )
+            for p in params
+        )
+        return ThumbStream(*feeds, iis=self)
 
     def location_feed(
         self, *location_ids: Union[int, str, Iterator[Union[int, str]]]
@@ -78,9 +176,18 @@ class InstagramIS:
         params = ({"location_id": i, "count": 50} for i in location_ids)
         media_path = ("data", "location", "edge_location_to_media")
         feeds = (
-            self._paginate_thumb_feed("location_feed", p, media_path) for p in params
+            PagedFeed(
+                partial(
+                    self._paginate_feed,
+                    "location_feed",
+                    p,
+                    media_path,
+                    self._node_to_post_thumb,
+                )
+            )
+            for p in params
         )
-        return ThumbStream(*feeds)
+        return ThumbStream(*feeds, iis=self)
 
     def user_feed(
         self, *user_ids_or_usernames: Union[int, str, Iterator[Union[int, str]]]
@@ -104,16 +211,50 @@ class InstagramIS:
             for i in user_ids
         )
         media_path = ("data", "user", "edge_owner_to_timeline_media")
-        feeds = (self._paginate_thumb_feed("user_feed", p, media_path) for p in params)
-        return ThumbStream(*feeds)
+        feeds = (
+            PagedFeed(
+                partial(
+                    self._paginate_feed,
+                    "user_feed",
+                    p,
+                    media_path,
+                    self._node_to_post_thumb,
+                )
+            )
+            for p in params
+        )
+        return ThumbStream(*feeds, iis=self)
 
     def search_feed(self):
         # todo
         raise NotImplementedError
 
-    def comment_feed(self):
-        # todo
-        raise NotImplementedError
+    def comment_feed(
+        self, *shortcodes: Union[str, Iterator[str]], concurrency: int = 4
+    ) -> CommentStream:
+        """
+        Stream of comments, <post 1 comments>, <post 2 comments>, etc.
+        :param shortcodes: posts to get comments from
+        :param concurrency: how many posts are fetched at once, all requests still share
+            the client's rate limit
+        :return:
+        """
+        shortcodes = collapse(shortcodes)
+        media_path = ("data", "shortcode_media", "edge_media_to_comment")
+        feeds = (
+            PagedFeed(
+                partial(
+                    self._paginate_feed,
+                    "media_comments",
+                    {"short_code": s, "extract": False, "count": 50},
+                    media_path,
+                    partial(self._node_to_comment, post_shortcode=s),
+                )
+            )
+            for s in shortcodes
+        )
+        # shortcodes may come from a stream that is still running, so don't unpack them
+        return CommentStream.from_feeds(feeds, concurrency=concurrency, iis=self)
 
     def _post_info(
         self, shortcode_or_model: Union[str, InstagramPost]
@@ -122,29 +263,30 @@ class InstagramIS:
             return shortcode_or_model
         shortcode = shortcode_or_model
 
-        d = Addict(self._web_api_client.media_info2(shortcode))
+        d = self._web_api_client.media_info2(shortcode)
+        caption = _dig(d, "caption", "text")
         return InstagramPost(
-            post_num_id=d.id or None,  # todo: this is actually a str
-            shortcode=d.shortcode or None,
-            img_height=_to_int(d.dimensions.height),
-            img_width=_to_int(d.dimensions.width),
-            display_url=d.display_url or None,
-            is_video=_to_bool(d.is_video),
-            caption_is_edited=_to_bool(d.caption_is_edited),
-            created_at=_timestamp_to_datetime(d.taken_at_timestamp),
-            like_count=_to_int(d.likes.count),
-            comment_count=_to_int(d.comments.count),
-            location_id=_to_int(d.location and d.location.id),
-            location_name=(d.location and d.location.name) or None,
-            location_address_json=(d.location and d.location.address_json) or None,
-            owner_id=_to_int(d.owner.id),
-            owner_username=d.owner.username or None,
-            owner_full_name=d.owner.full_name or None,
-            is_ad=_to_bool(d.is_ad),
-            caption=d.caption.text or None,
-            users_in_photo=[p.user for p in d.users_in_photo],
-            hashtags=_get_hashtags(d.caption.text),
-            mentions=_get_mentions(d.caption.text),
+            post_num_id=d.get("id") or None,  # todo: this is actually a str
+            shortcode=d.get("shortcode") or None,
+            img_height=_to_int(_dig(d, "dimensions", "height")),
+            img_width=_to_int(_dig(d, "dimensions", "width")),
+            display_url=d.get("display_url") or None,
+            is_video=_to_bool(d.get("is_video")),
+            caption_is_edited=_to_bool(d.get("caption_is_edited")),
+            created_at=_timestamp_to_datetime(d.get("taken_at_timestamp")),
+            like_count=_to_int(_dig(d, "likes", "count")),
+            comment_count=_to_int(_dig(d, "comments", "count")),
+            location_id=_to_int(_dig(d, "location", "id")),
+            location_name=_dig(d, "location", "name") or None,
+            location_address_json=_dig(d, "location", "address_json") or None,
+            owner_id=_to_int(_dig(d, "owner", "id")),
+            owner_username=_dig(d, "owner", "username") or None,
+            owner_full_name=_dig(d, "owner", "full_name") or None,
+            is_ad=_to_bool(d.get("is_ad")),
+            caption=caption or None,
+            users_in_photo=[p.get("user") for p in d.get("users_in_photo") or ()],
+            hashtags=_get_hashtags(caption),
+            mentions=_get_mentions(caption),
         )
 
     def _user_info(self, u: Union[str, int]) -> InstagramUser:
@@ -167,22 +309,22 @@ class InstagramIS:
 
         username = u
 
-        d = Addict(self._web_api_client.user_info2(user_name=username))
+        d = self._web_api_client.user_info2(user_name=username)
         return InstagramUser(
-            biography=d.biography or None,
-            website=d.website or None,
-            followed_by_count=_to_int(d.counts.followed_by),
-            follows_count=_to_int(d.counts.follows),
-            full_name=d.full_name or None,
-            user_id=_to_int(d.id),
-            is_business_account=_to_bool(d.is_business_account),
-            is_joined_recently=_to_bool(d.is_joined_recently),
-            is_private=_to_bool(d.is_private),
-            is_verified=_to_bool(d.is_verified),
-            profile_pic_url=d.profile_pic_url or None,
-            username=d.username or None,
-            connected_fb_page=d.connected_fb_page or None,
-            media_count=_to_int(d.counts.media),
+            biography=d.get("biography") or None,
+            website=d.get("website") or None,
+            followed_by_count=_to_int(_dig(d, "counts", "followed_by")),
+            follows_count=_to_int(_dig(d, "counts", "follows")),
+            full_name=d.get("full_name") or None,
+            user_id=_to_int(d.get("id")),
+            is_business_account=_to_bool(d.get("is_business_account")),
+            is_joined_recently=_to_bool(d.get("is_joined_recently")),
+            is_private=_to_bool(d.get("is_private")),
+            is_verified=_to_bool(d.get("is_verified")),
+            profile_pic_url=d.get("profile_pic_url") or None,
+            username=d.get("username") or None,
+            connected_fb_page=d.get("connected_fb_page") or None,
+            media_count=_to_int(_dig(d, "counts", "media")),
         )
 
     def user(
@@ -198,6 +340,8 @@ class InstagramIS:
         """
 
         # Be conservative in what you do, be liberal in what you accept
+        if isinstance(u, InstagramMedia):
+            u = u.post
         if isinstance(u, InstagramUser):
             return u
         if isinstance(u, InstagramPost):
@@ -205,21 +349,36 @@ class InstagramIS:
         if isinstance(u, InstagramPostThumb):
             return self._user_info(u.owner_num_id)
         if isinstance(u, InstagramComment):
-            # todo
-            raise NotImplementedError
+            return self._user_info(u.owner_username)
+        if isinstance(u, InstagramUserThumb):
+            return self._user_info(u.username)
         return self._user_info(u)
 
+    def _user_id(self, u: ANY_USER) -> int:
+        if isinstance(u, InstagramMedia):
+            u = u.post
+        if isinstance(u, (InstagramUser, InstagramUserThumb)):
+            return u.user_id
+        if isinstance(u, InstagramPost):
+            return u.owner_id
+        if isinstance(u, InstagramPostThumb):
+            return u.owner_num_id
+        if isinstance(u, InstagramComment):
+            return u.owner_id
+        return _to_int(u) or self._user_info(u).user_id
+
     def users(
         self,
-        *u: Union[int, str, InstagramUser, Iterator[Union[int, str, InstagramUser]]]
+        *u: Union[int, str, InstagramUser, Iterator[Union[int, str, InstagramUser]]],
     ) -> Iterator[InstagramUser]:
         """
         Return a stream of user data from a stream of users
         :param u: usernames, user_ids, various models, Iterators, etc
         :return: a stream of data about the input users
         """
-        u = collapse(u, base_type=InstagramUser)
-        return UserStream(self.user(i) for i in u)
+        # models are tuples, so don't flatten them
+        u = collapse(u, base_type=(InstagramUser, InstagramUserThumb))
+        return UserStream((self.user(i) for i in u), iis=self)
 
     def post(
         self, p: Union[int, str, InstagramPost, InstagramPostThumb, InstagramComment]
@@ -231,13 +390,16 @@ class InstagramIS:
         """
 
         # Be conservative in what you do, be liberal in what you accept
+        if isinstance(p, InstagramMedia):
+            p = p.post
         if isinstance(p, InstagramPost):
             return p
         if isinstance(p, InstagramPostThumb):
             return self._post_info(p.shortcode)
         if isinstance(p, InstagramComment):
-            # todo
-            raise NotImplemented
+            return self._post_info(p.post_shortcode)
+        if isinstance(p, int) or p.isdigit():
+            return self._post_info(_post_id_to_shortcode(p))
         return self._post_info(p)
 
     def posts(
@@ -251,15 +413,15 @@ class InstagramIS:
             Iterator[
                 Union[int, str, InstagramPost, InstagramPostThumb, InstagramComment]
             ],
-        ]
+        ],
     ) -> Iterator[InstagramPost]:
         """
         Return a stream of post data from a stream of posts
         :param p: post shortcodes, post_ids, various models, Iterators, etc
         :return: a stream of data about the input posts
         """
-        p = collapse(p, base_type=InstagramPost)
-        return PostStream(self.post(s) for s in p)
+        p = collapse(p, base_type=(InstagramPost, InstagramMedia))
+        return PostStream((self.post(s) for s in p), iis=self)
 
     def comments(
         self,
@@ -272,29 +434,193 @@ class InstagramIS:
             Iterator[
                 Union[int, str, InstagramPost, InstagramPostThumb, InstagramComment]
             ],
-        ]
-    ) -> Iterator[InstagramComment]:
-        c = collapse(c, base_type=InstagramComment)
-        # todo: logic to get comments from a post/post-like obj
-        raise NotImplementedError
+        ],
+        concurrency: int = 4,
+    ) -> CommentStream:
+        """
+        Return a stream of comments from a stream of posts
+        :param c: post shortcodes, post_ids, various models, Iterators, etc
+        :param concurrency: how many posts are fetched at once
+        :return: a stream of comments of the input posts
+        """
+        # models are tuples, so don't flatten them
+        c = collapse(
+            c,
+            base_type=(
+                InstagramPost,
+                InstagramPostThumb,
+                InstagramComment,
+                InstagramMedia,
+            ),
+        )
+        return self.comment_feed(
+            (self._post_shortcode(i) for i in c), concurrency=concurrency
+        )
+
+    @staticmethod
+    def _post_shortcode(
+        p: Union[int, str, InstagramPost, InstagramPostThumb, InstagramComment],
+    ) -> str:
+        if isinstance(p, (InstagramPost, InstagramPostThumb, InstagramMedia)):
+            return p.shortcode
+        if isinstance(p, InstagramComment):
+            return p.post_shortcode
+        if isinstance(p, int) or p.isdigit():
+            return _post_id_to_shortcode(p)
+        return p
+
+    def _user_list_feed(
+        self,
+        feed_name: str,
+        feed_kwargs: dict,
+        media_path: Iterator[str],
+        max_results: Optional[int] = None,
+        stop: Optional[threading.Event] = None,
+    ) -> Iterator[InstagramUserThumb]:
+        return self._paginate_feed(
+            feed_name,
+            {**feed_kwargs, "extract": False, "count": 50},
+            media_path,
+            self._node_to_user_thumb,
+            max_results=max_results,
+            stop=stop,
+        )
 
-    def followed_by(self) -> Iterator[str]:
+    def followed_by(
+        self, *u: Union[ANY_USER, Iterator[ANY_USER]], concurrency: int = 1
+    ) -> UserThumbStream:
         """
-        Who is following this user
+        Who is following these users, <user 1 followers>, <user 2 followers>, etc.
+        Login required.
+        :param u: usernames, user_ids, various models, Iterators, etc
+        :param concurrency: how many users are fetched at once
         :return:
         """
-        raise NotImplementedError
+        u = collapse(u, base_type=tuple(ANY_USER.__args__))
+        media_path = ("data", "user", "edge_followed_by")
+        feeds = (
+            PagedFeed(
+                partial(
+                    self._user_list_feed,
+                    "user_followers",
+                    {"user_id": self._user_id(i)},
+                    media_path,
+                )
+            )
+            for i in u
+        )
+        return UserThumbStream.from_feeds(feeds, concurrency=concurrency, iis=self)
 
-    def following(self) -> Iterator[str]:
+    def following(
+        self, *u: Union[ANY_USER, Iterator[ANY_USER]], concurrency: int = 1
+    ) -> UserThumbStream:
         """
-        Who is this user following
+        Who are these users following, <user 1 following>, <user 2 following>, etc.
+        Login required.
+        :param u: usernames, user_ids, various models, Iterators, etc
+        :param concurrency: how many users are fetched at once
         :return:
         """
-        raise NotImplementedError
+        u = collapse(u, base_type=tuple(ANY_USER.__args__))
+        media_path = ("data", "user", "edge_follow")
+        feeds = (
+            PagedFeed(
+                partial(
+                    self._user_list_feed,
+                    "user_following",
+                    {"user_id": self._user_id(i)},
+                    media_path,
+                )
+            )
+            for i in u
+        )
+        return UserThumbStream.from_feeds(feeds, concurrency=concurrency, iis=self)
 
-    def likers(self) -> Iterator[str]:
+    def likers(
+        self,
+        *p: Union[
+            int,
+            str,
+            InstagramPost,
+            InstagramPostThumb,
+            Iterator[Union[int, str, InstagramPost, InstagramPostThumb]],
+        ],
+        concurrency: int = 1,
+    ) -> UserThumbStream:
         """
-        Who liked this post
+        Who liked these posts, <post 1 likers>, <post 2 likers>, etc.
+        Login required.
+        :param p: post shortcodes, post_ids, various models, Iterators, etc
+        :param concurrency: how many posts are fetched at once
         :return:
         """
-        raise NotImplementedError
+        p = collapse(p, base_type=(InstagramPost, InstagramPostThumb, InstagramMedia))
+        media_path = ("data", "shortcode_media", "edge_liked_by")
+        feeds = (
+            PagedFeed(
+                partial(
+                    self._user_list_feed,
+                    "media_likers",
+                    {"short_code": self._post_shortcode(i)},
+                    media_path,
+                )
+            )
+            for i in p
+        )
+        return UserThumbStream.from_feeds(feeds, concurrency=concurrency, iis=self)
+
+    def follow_graph(
+        self,
+        *seeds: Union[ANY_USER, Iterator[ANY_USER]],
+        state_dir: str,
+        direction: str = "followed_by",
+        max_depth: int = 2,
+        max_fan_out: Optional[int] = None,
+        checkpoint_every: int = 100,
+    ) -> FollowStream:
+        """
+        Breadth-first crawl of the follower graph, see graph.crawl_graph.
+        Stopping the stream saves the crawl in state_dir, running it again with the same
+        state_dir resumes it. Login required.
+        :param seeds: users to start from
+        :param state_dir: where the frontier and visited users are saved
+        :param direction: "followed_by" crawls followers, "following" crawls followings
+        :param max_depth: hops away from the seeds that are crawled, 1 only crawls seeds
+        :param max_fan_out: most followers/followings crawled from each user
+        :param checkpoint_every: how many users are crawled between saving state
+        :return: stream of follows, in breadth-first order
+        """
+        if direction == "followed_by":
+            feed_name, edge_name = "user_followers", "edge_followed_by"
+        elif direction == "following":
+            feed_name, edge_name = "user_following", "edge_follow"
+        else:
+            raise ValueError(f"Unknown direction {direction}")
+
+        def neighbours(user_id: int, max_results: Optional[int]) -> Iterator[int]:
+            feed = self._user_list_feed(
+                feed_name,
+                {"user_id": user_id},
+                ("data", "user", edge_name),
+                max_results=max_results,
+            )
+            return (t.user_id for t in feed)
+
+        seeds = collapse(seeds, base_type=tuple(ANY_USER.__args__))
+        edges = crawl_graph(
+            neighbours,
+            (self._user_id(s) for s in seeds),
+            state_dir,
+            max_depth=max_depth,
+            max_fan_out=max_fan_out,
+            checkpoint_every=checkpoint_every,
+        )
+        if direction == "followed_by":
+            follows = (
+                InstagramFollow(e.target_id, e.source_id, e.depth) for e in edges
+            )
+        else:
+            follows = (
+                InstagramFollow(e.source_id, e.target_id, e.depth) for e in edges
+            )
+        return FollowStream(follows, iis=self)
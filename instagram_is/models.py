@@ -1,4 +1,4 @@
-from typing import NamedTuple, Dict, Sequence
+from typing import NamedTuple, Dict, Optional, Sequence, Union
 
 import pendulum
 
@@ -78,6 +78,50 @@ class InstagramUser(NamedTuple):
     media_count: int
 
 
+class InstagramUserThumb(NamedTuple):
+    user_id: int
+    username: str
+    full_name: str
+    profile_pic_url: str
+    is_verified: bool
+
+
+class InstagramFollow(NamedTuple):
+    follower_id: int
+    followed_id: int
+    # crawl depth of the user whose followers/followings were fetched
+    depth: int
+
+
 class InstagramComment(NamedTuple):
-    # todo
-    pass
+    comment_id: int
+    post_shortcode: str
+    text: str
+    created_at: pendulum.datetime
+    owner_id: int
+    owner_username: str
+    owner_profile_pic_url: str
+    hashtags: Sequence[str]
+    mentions: Sequence[str]
+
+    @property
+    def simple_str(self):
+        d = self.created_at.to_datetime_string()
+        return f"{self.post_shortcode} {d} {self.text[:30]}"
+
+
+class InstagramMedia(NamedTuple):
+    """
+    A post or thumb with its media downloaded, see ThumbStream/PostStream.download_media.
+    Other attributes are those of the post, e.g. media.shortcode or media.engagement.
+    """
+
+    post: Union[InstagramPostThumb, InstagramPost]
+    media_path: Optional[str] = None
+    # repr of the error if the download failed
+    media_error: Optional[str] = None
+
+    def __getattr__(self, name):
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return getattr(self.post, name)
@@ -1,23 +1,79 @@
+import random
+import threading
+import time
+from functools import wraps
+from http.client import HTTPException
+from socket import timeout, error as SocketError
+from ssl import SSLError
+from urllib.error import URLError
+
 from backoff import on_exception, expo
 from instagram_web_api import Client
-from instagram_web_api.errors import ClientError
-from ratelimit import limits, RateLimitException
+from instagram_web_api.errors import ClientError, ClientConnectionError
+
+from instagram_is.tools import _json_loads
+
+
+class _Throttle:
+    """
+    Spaces calls to the decorated function period to period + jitter seconds apart.
+    Callers block until their turn instead of failing, so threads reading feeds
+    concurrently queue up for the next slot and never give up on a busy limiter.
+    """
+
+    def __init__(self, period: float, jitter: float = 0):
+        self.period = period
+        self.jitter = jitter
+        self._lock = threading.Lock()
+        self._next_call = 0.0
+
+    def __call__(self, fxn):
+        @wraps(fxn)
+        def wrapper(*args, **kwargs):
+            with self._lock:
+                wait = self._next_call - time.monotonic()
+                if wait > 0:
+                    time.sleep(wait)
+                gap = self.period + random.uniform(0, self.jitter)
+                self._next_call = time.monotonic() + gap
+            return fxn(*args, **kwargs)
+
+        return wrapper
+
+
+# shared by every client, instagram limits the whole process
+_throttle = _Throttle(period=1.2, jitter=0.6)
 
 
 class CustomWebApiClient(Client):
     """
     Patch to rate-limit & retry connections to instagram.
-    Limit calls to 1 per 1.2 seconds. If this is exceeded RateLimitException is thrown.
-    When RateLimitException is thrown, retry with an exponential backoff + jitter,
-    up to 3 mins before giving up and raising the error.
+    Limit calls to 1 per 1.2 to 1.8 seconds, callers wait for their turn (see _Throttle).
     This was done to try and put some random wait times between calls to instagram so
     all calls are not so rapid and evenly spaced.
     When ClientError is thrown it usually means instagram is throttling us, so retry with
     exponential backoff + jitter up to 15 mins total wait time before giving up.
+    Response bodies are decoded with orjson when it is installed (see tools._json_loads).
     """
 
     @on_exception(expo, ClientError, max_time=60 * 15)
-    @on_exception(expo, RateLimitException, max_time=60 * 3)
-    @limits(calls=1, period=1.2)
-    def _make_request(self, *args, **kwargs):
-        return super()._make_request(*args, **kwargs)
+    @_throttle
+    def _make_request(self, *args, return_response=False, **kwargs):
+        res = super()._make_request(*args, return_response=True, **kwargs)
+        if return_response:
+            return res
+        try:
+            response_content = self._read_response(res)
+        except (
+            SSLError,
+            timeout,
+            SocketError,
+            URLError,
+            HTTPException,
+            ConnectionError,
+        ) as connection_error:
+            # same as upstream, which reads the body inside its own error handling
+            raise ClientConnectionError(
+                f"{connection_error.__class__.__name__} {connection_error}"
+            )
+        return _json_loads(response_content)
@@ -1,39 +1,92 @@
 from __future__ import annotations
 
 import csv
-from collections import abc
+import logging
+import os
+import pickle
+import queue
+import threading
+import warnings
+from collections import abc, deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from datetime import datetime
-from functools import partial
-from itertools import dropwhile, islice, chain
-from operator import attrgetter
+from http.client import HTTPException
+from itertools import dropwhile, groupby, islice, chain, repeat
+from operator import attrgetter, itemgetter
 from typing import (
     Callable,
     Iterator,
+    List,
     Any,
     Optional,
     Sequence,
+    Tuple,
     Union,
     TypeVar,
     NamedTuple,
+    TYPE_CHECKING,
 )
 
 import pendulum
-from more_itertools import unique_everseen
+from more_itertools import chunked, unique_everseen
 
+from instagram_is.downloads import download_file, media_file_path
 from instagram_is.tools import sort_n, _get_datetime
-from .models import InstagramPostThumb, InstagramPost, InstagramUser, InstagramComment
+from .models import (
+    InstagramPostThumb,
+    InstagramPost,
+    InstagramUser,
+    InstagramComment,
+    InstagramUserThumb,
+    InstagramFollow,
+    InstagramMedia,
+)
+
+if TYPE_CHECKING:
+    from .instagram_is import InstagramIS
+
+logger = logging.getLogger(__name__)
+
+ANY_MODEL = Union[
+    InstagramPostThumb,
+    InstagramPost,
+    InstagramUser,
+    InstagramComment,
+    InstagramUserThumb,
+    InstagramFollow,
+    InstagramMedia,
+]
+
 
-ANY_MODEL = Union[InstagramPostThumb, InstagramPost, InstagramUser, InstagramComment]
+class _FeedError(NamedTuple):
+    error: Exception
+
+
+# marks the end of a stream read by a StreamMuxer worker
+_FEED_END = object()
 
 
 class StreamMuxer(abc.Iterator):
     """
     Proxy object that handles applying changes to individual streams.
     Once iteration has begun, these smaller feeds are combined to act as a single stream.
+    With concurrency > 1, that many streams are consumed at once in worker threads, the
+    combined stream keeps the same order.
     """
 
-    def __init__(self, streams):
+    def __init__(
+        self,
+        streams,
+        concurrency: int = 1,
+        stop: Optional[threading.Event] = None,
+        buffer_size: int = 50,
+    ):
         self._streams = streams
+        self.concurrency = concurrency
+        # set once the combined stream is closed, tells workers (and feeds) to stop
+        self.stop = stop or threading.Event()
+        # elements each worker may read ahead of the consumer
+        self.buffer_size = buffer_size
 
     def __next__(self) -> ANY_MODEL:
         return next(self.__iter__())
@@ -45,8 +98,62 @@ class StreamMuxer(abc.Iterator):
         # with the first batch of results loaded in memory. Even if it was not the case
         # that it accepted only *args, using a roundrobin would still load each stream's
         # first batch of results.
+        if self.concurrency > 1:
+            return self._iter_concurrent()
         return chain.from_iterable(self._streams)
 
+    def _iter_concurrent(self) -> Iterator[ANY_MODEL]:
+        """
+        Each stream is read by a worker thread which hands elements over through a small
+        queue, so workers only read buffer_size elements ahead of the consumer and
+        nothing is fetched after the combined stream is closed.
+        """
+        pending = deque()
+        try:
+            for stream in self._streams:
+                buffer = queue.Queue(self.buffer_size)
+                # daemon, a worker waiting on instagram must not keep the process alive
+                worker = threading.Thread(
+                    target=self._drain, args=(stream, buffer), daemon=True
+                )
+                worker.start()
+                pending.append(buffer)
+                if len(pending) >= self.concurrency:
+                    yield from self._iter_buffer(pending.popleft())
+            while pending:
+                yield from self._iter_buffer(pending.popleft())
+        finally:
+            self.stop.set()
+
+    def _drain(self, stream: Iterator[ANY_MODEL], buffer: queue.Queue) -> None:
+        try:
+            for e in stream:
+                if not self._put(buffer, e):
+                    return
+        except Exception as err:
+            self._put(buffer, _FeedError(err))
+        else:
+            self._put(buffer, _FEED_END)
+
+    def _put(self, buffer: queue.Queue, item: Any) -> bool:
+        while not self.stop.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    @staticmethod
+    def _iter_buffer(buffer: queue.Queue) -> Iterator[ANY_MODEL]:
+        while True:
+            item = buffer.get()
+            if item is _FEED_END:
+                return
+            if isinstance(item, _FeedError):
+                raise item.error
+            yield item
+
     def map_streams(self, fxn: Callable) -> None:
         self._streams = map(fxn, self._streams)
 
@@ -75,35 +182,441 @@ class GenericStream(Iterator[T]):
         return GenericStream(map(fxn, self))
 
 
+class PagedFeed(abc.Iterable):
+    """
+    A single paginated instagram feed, only fetched once iterated.
+    Before iteration the stream planner may set max_results, so that the page sizes
+    requested from instagram shrink to what will actually be consumed.
+    """
+
+    def __init__(self, paginate: Callable[..., Iterator[T]]):
+        self._paginate = paginate
+        self.max_results: Optional[int] = None
+        # set when the stream is closed, no more pages are requested after that
+        self.stop: Optional[threading.Event] = None
+
+    def __iter__(self) -> Iterator[T]:
+        return self._paginate(max_results=self.max_results, stop=self.stop)
+
+
+class MaterializedFeed(abc.Iterable):
+    """
+    Elements of one feed of a stream that has already been run, replayed from memory or
+    from a segment of a file. Files hold pickled batches of elements, so only load files
+    you wrote yourself.
+    """
+
+    def __init__(
+        self,
+        elements: Optional[List[NamedTuple]] = None,
+        path: Optional[str] = None,
+        start: int = 0,
+        end: int = 0,
+    ):
+        self._elements = elements
+        self.path = path
+        # offsets of the feed's batches in the file
+        self.start = start
+        self.end = end
+
+    @classmethod
+    def from_stream(
+        cls,
+        stream: Iterator[Tuple[int, NamedTuple]],
+        path: Optional[str] = None,
+        batch_size: int = 1000,
+    ) -> List[MaterializedFeed]:
+        """
+        Run a stream of (feed index, element) pairs, see NamedTupleStream._plan.
+        :return: one materialized feed per original feed
+        """
+        feeds = NamedTupleStream._split_feeds(stream)
+        if path is None:
+            return [cls(list(feed)) for feed in feeds]
+        materialized = []
+        with open(path, "wb") as fh:
+            for feed in feeds:
+                start = fh.tell()
+                for batch in chunked(feed, batch_size):
+                    pickle.dump(batch, fh, protocol=pickle.HIGHEST_PROTOCOL)
+                materialized.append(cls(path=path, start=start, end=fh.tell()))
+        return materialized
+
+    def __iter__(self) -> Iterator[NamedTuple]:
+        if self._elements is not None:
+            return iter(self._elements)
+        return self._read()
+
+    def _read(self) -> Iterator[NamedTuple]:
+        with open(self.path, "rb") as fh:
+            fh.seek(self.start)
+            while fh.tell() < self.end:
+                yield from pickle.load(fh)
+
+
+class _BoundedTee:
+    """
+    Shares one stream between several consumers, buffering only the elements that not
+    every consumer has read yet, up to max_buffer.
+    """
+
+    def __init__(
+        self, stream: Iterator[NamedTuple], n: int, max_buffer: int, timeout: float
+    ):
+        self._stream = iter(stream)
+        self._buffer = deque()
+        # position in the stream of self._buffer[0]
+        self._offset = 0
+        # next position each consumer will read, None once it stopped reading
+        self._positions = [0] * n
+        self._done = False
+        self._condition = threading.Condition()
+        self.max_buffer = max_buffer
+        self.timeout = timeout
+
+    def consume(self, i: int) -> Iterator[NamedTuple]:
+        try:
+            while True:
+                with self._condition:
+                    if not self._wait_for_element(i):
+                        return
+                    pos = self._positions[i]
+                    e = self._buffer[pos - self._offset]
+                    self._positions[i] = pos + 1
+                    self._trim()
+                yield e
+        finally:
+            with self._condition:
+                self._positions[i] = None
+                self._trim()
+
+    def _wait_for_element(self, i: int) -> bool:
+        """
+        Make sure the next element for consumer i is buffered, False if there is none.
+        """
+
+        def buffered() -> bool:
+            return self._positions[i] - self._offset < len(self._buffer)
+
+        while not buffered():
+            if self._done:
+                return False
+            if len(self._buffer) < self.max_buffer:
+                try:
+                    self._buffer.append(next(self._stream))
+                except StopIteration:
+                    self._done = True
+                return buffered()
+            # slower consumers in other threads may catch up, or fetch it for us
+            if not self._condition.wait_for(
+                lambda: buffered() or len(self._buffer) < self.max_buffer,
+                self.timeout,
+            ):
+                raise BufferError(
+                    f"Tee'd stream is {self.max_buffer} elements ahead of another, "
+                    f"consume them side by side or use materialize() instead"
+                )
+        return True
+
+    def _trim(self) -> None:
+        positions = [p for p in self._positions if p is not None]
+        slowest = min(positions) if positions else self._offset + len(self._buffer)
+        while self._offset < slowest:
+            self._buffer.popleft()
+            self._offset += 1
+        self._condition.notify_all()
+
+
+class _Op(NamedTuple):
+    name: str
+    kwargs: dict
+
+
+# operations that apply to each feed individually (when pushed down by the planner)
+_FEED_OPS = {"filter", "limit_each"}
+# stream-wide operations which give the same results if a filter is applied before them
+# (filters run before downloads, so only media of elements that are kept is fetched)
+_FILTER_COMMUTES = {"unique", "sort", "download_media"}
+# operations that pass every element through
+_PASS_THROUGH_OPS = {"save_csv", "download_media"}
+
+
 class NamedTupleStream(GenericStream[NamedTuple]):
-    def __init__(self, *feeds: Iterator[NamedTuple], log_progress=100):
+    def __init__(
+        self,
+        *feeds: Iterator[NamedTuple],
+        log_progress=100,
+        concurrency: int = 1,
+        iis: Optional[InstagramIS] = None,
+    ):
 
-        # why _stream & _stream_muxer?
-        # some operations work on individual streams, instead of the chained version
-        # these operations must be allowed to be applied at any time before iteration
-        self._stream_muxer = StreamMuxer(feeds)
-        self._stream = self._stream_muxer
+        # why record operations instead of applying them?
+        # some operations work on individual feeds, instead of the chained version,
+        # and the order they are chained in should not decide how much is fetched;
+        # the operations are planned once iteration begins (see _plan)
+        self._feeds = feeds
+        self._ops: List[_Op] = []
 
         self.log_progress = log_progress
+        # how many feeds are fetched at once, see StreamMuxer
+        self.concurrency = concurrency
+        # used to stream related data, e.g. comments of posts
+        self._iis = iis
+
+    @classmethod
+    def from_feeds(
+        cls, feeds: Iterator[Iterator[NamedTuple]], **kwargs
+    ) -> NamedTupleStream:
+        """
+        Like cls(*feeds), without creating every feed before iteration begins.
+        """
+        stream = cls(**kwargs)
+        stream._feeds = feeds
+        return stream
 
     def __iter__(self) -> Iterator[NamedTuple]:
+        return self._log_progress(self._plan())
+
+    def _log_progress(self, stream: Iterator[T]) -> Iterator[T]:
         # todo: move into generic stream
-        for i, e in enumerate(self._stream, 1):
+        for i, e in enumerate(stream, 1):
             if self.log_progress and i % self.log_progress == 0:
                 print(f"Streamed {i} elements.")
             yield e
 
+    def _add_op(self, name: str, **kwargs) -> NamedTupleStream:
+        self._ops.append(_Op(name, kwargs))
+        return self
+
+    def _plan(self, feed_index: bool = False) -> Iterator[NamedTuple]:
+        """
+        Build the pipeline of generators from the recorded operations:
+        - filters are pushed down to each feed when nothing before them prevents it,
+          so each feed can stop paginating on its own (see _filter)
+        - unique followed by top is fused into a single pass
+        - feeds are asked for no more results than the leading limits allow, which
+          also sizes the pages requested from instagram; feeds are muxed in order, so
+          a limit on the whole stream only leaves later feeds what is still missing
+        :param feed_index: yield (feed index, element) pairs, so that the feeds can be
+            split apart again (see materialize and tee); operations on the whole stream
+            other than save_csv and download_media merge every feed into feed 0
+        :return: the planned stream
+        """
+        feed_ops, stream_ops = [], []
+        for op in self._ops:
+            if op.name in _FEED_OPS and all(
+                o.name in _FILTER_COMMUTES for o in stream_ops
+            ):
+                feed_ops.append(op)
+            else:
+                if op.name == "filter" and op.kwargs["max_tail_skip"]:
+                    warnings.warn(
+                        "filter after limit/top can't be applied to each feed, so "
+                        "max_tail_skip is ignored and every feed is read to the end"
+                    )
+                stream_ops.append(op)
+        stream_ops = self._fuse_ops(stream_ops)
+        feed_max_results = self._max_results(feed_ops)
+        stream_max_results = None
+        if all(op.name == "limit_each" for op in feed_ops):
+            stream_max_results = self._max_results(stream_ops)
+        keep_feeds = all(op.name in _PASS_THROUGH_OPS for op in stream_ops)
+        # elements muxed so far, to share a limit on the whole stream between feeds
+        muxed = 0
+        # feed index of each element between the muxer and the end of the stream
+        indices = deque()
+        stop = threading.Event()
+
+        def plan_feed(indexed_feed: Tuple[int, Iterator[NamedTuple]]) -> Iterator:
+            i, feed = indexed_feed
+            if isinstance(feed, PagedFeed):
+                limits = [feed_max_results]
+                if stream_max_results is not None:
+                    limits.append(max(stream_max_results - muxed, 0))
+                feed.max_results = min(
+                    (n for n in limits if n is not None), default=None
+                )
+                feed.stop = stop
+            feed = iter(feed)
+            for feed_op in feed_ops:
+                feed = self._apply_op(feed, feed_op, per_feed=True)
+            if feed_index and keep_feeds:
+                return zip(repeat(i), feed)
+            return feed
+
+        def count_muxed(stream: Iterator[NamedTuple]) -> Iterator[NamedTuple]:
+            nonlocal muxed
+            for e in stream:
+                muxed += 1
+                yield e
+
+        def remove_index(stream: Iterator[tuple]) -> Iterator[NamedTuple]:
+            for i, e in stream:
+                indices.append(i)
+                yield e
+
+        def restore_index(stream: Iterator[NamedTuple]) -> Iterator[tuple]:
+            # only valid as the remaining operations keep every element, in order
+            for e in stream:
+                yield indices.popleft(), e
+
+        stream_muxer = StreamMuxer(
+            enumerate(self._feeds), concurrency=self.concurrency, stop=stop
+        )
+        stream_muxer.map_streams(plan_feed)
+        stream = iter(stream_muxer)
+        if feed_index and keep_feeds:
+            stream = remove_index(stream)
+        if stream_max_results is not None:
+            stream = count_muxed(stream)
+        for op in stream_ops:
+            stream = self._apply_op(stream, op, per_feed=False)
+        if feed_index:
+            stream = restore_index(stream) if keep_feeds else zip(repeat(0), stream)
+        return stream
+
+    @staticmethod
+    def _split_feeds(
+        stream: Iterator[Tuple[int, NamedTuple]],
+    ) -> Iterator[Iterator[NamedTuple]]:
+        """
+        Feeds of a stream of (feed index, element) pairs, see _plan.
+        """
+        return (map(itemgetter(1), feed) for _, feed in groupby(stream, itemgetter(0)))
+
+    @staticmethod
+    def _fuse_ops(ops: Sequence[_Op]) -> Sequence[_Op]:
+        fused = []
+        for op in ops:
+            prev = fused[-1] if fused else None
+            if prev and prev.name == "unique" and op.name == "unique":
+                continue
+            if prev and prev.name == "unique" and op.name == "top":
+                # top can dedupe while it sorts, without remembering every element
+                fused[-1] = op._replace(kwargs={**op.kwargs, "unique": True})
+                continue
+            if prev and prev.name == "top" and prev.kwargs["unique"]:
+                if op.name == "unique":
+                    continue
+            fused.append(op)
+        return fused
+
+    @staticmethod
+    def _max_results(ops: Sequence[_Op]) -> Optional[int]:
+        """
+        Most elements any single feed has to produce, None if it could be all of them.
+        """
+        max_results = None
+        for op in ops:
+            if op.name in _PASS_THROUGH_OPS:
+                continue
+            if op.name not in ("limit", "limit_each"):
+                # following limits no longer count raw feed elements
+                break
+            n = op.kwargs["max_results"]
+            max_results = n if max_results is None else min(max_results, n)
+        return max_results
+
+    @classmethod
+    def _apply_op(
+        cls, stream: Iterator[NamedTuple], op: _Op, per_feed: bool
+    ) -> Iterator[NamedTuple]:
+        kwargs = op.kwargs
+        if op.name == "filter":
+            if per_feed:
+                return cls._filter(stream, **kwargs)
+            # max_tail_skip relies on the ordering of a single feed
+            return filter(kwargs["predicate"], stream)
+        if op.name in ("limit", "limit_each"):
+            return islice(stream, kwargs["max_results"])
+        if op.name == "unique":
+            return unique_everseen(stream)
+        if op.name == "sort":
+            return cls._sort(stream, **kwargs)
+        if op.name == "top":
+            return cls._top(stream, **kwargs)
+        if op.name == "save_csv":
+            return cls._save_csv(stream, **kwargs)
+        if op.name == "download_media":
+            return cls._download_media(stream, **kwargs)
+        raise ValueError(f"Unknown stream operation {op.name}")
+
+    def to_list(self) -> list:
+        return list(self)
+
+    def copy(self) -> NamedTupleStream:
+        """
+        New stream with the same feeds and operations so far, e.g. to sort or rank a
+        materialized stream several ways.
+        Streams whose feeds can only be read once, e.g. comment_feed or tee'd streams,
+        can't be copied: materialize them first.
+        """
+        if isinstance(self._feeds, abc.Iterator) or any(
+            isinstance(feed, abc.Iterator) for feed in self._feeds
+        ):
+            raise ValueError("Stream can only be read once, materialize it to copy it")
+        stream = self.from_feeds(
+            self._feeds,
+            log_progress=self.log_progress,
+            concurrency=self.concurrency,
+            iis=self._iis,
+        )
+        stream._ops = list(self._ops)
+        return stream
+
+    def materialize(self, path: Optional[str] = None) -> NamedTupleStream:
+        """
+        Run the stream now and keep its elements, in memory or in a file at path.
+        The returned stream can be iterated again (and copied) without fetching
+        anything from instagram again. Each feed is kept apart, so limit_each and
+        filters still apply to each of them, unless operations on the whole stream
+        (other than save_csv and download_media) already merged them into one.
+        Caution: Without path, loads all elements into memory.
+        """
+        stream = self._log_progress(self._plan(feed_index=True))
+        return type(self)(
+            *MaterializedFeed.from_stream(stream, path),
+            log_progress=self.log_progress,
+            iis=self._iis,
+        )
+
+    def tee(
+        self, n: int = 2, max_buffer: int = 10_000, timeout: float = 0
+    ) -> Tuple[NamedTupleStream, ...]:
+        """
+        Split into n streams that share a single run of this stream.
+        Only elements not yet read by every stream are buffered; if one stream gets
+        max_buffer elements ahead of another, it waits up to timeout seconds for the
+        others (consumed in other threads) to catch up, then raises BufferError.
+        Feeds are kept apart like with materialize.
+        """
+        stream = self._log_progress(self._plan(feed_index=True))
+        tee = _BoundedTee(stream, n, max_buffer, timeout)
+        return tuple(
+            type(self).from_feeds(
+                self._split_feeds(tee.consume(i)), log_progress=None, iis=self._iis
+            )
+            for i in range(n)
+        )
+
     def limit(self, max_results: int) -> NamedTupleStream:
         # todo: move into generic stream
-        self._stream = islice(self._stream, max_results)
-        return self
+        return self._add_op("limit", max_results=max_results)
+
+    def limit_each(self, max_results: int) -> NamedTupleStream:
+        """
+        Limit each feed individually, e.g. up to 10 posts from every location.
+        Must be applied before any operation on the whole stream.
+        """
+        if any(op.name not in _FEED_OPS for op in self._ops):
+            raise ValueError("limit_each must come before operations on whole stream")
+        return self._add_op("limit_each", max_results=max_results)
 
     def unique(self) -> NamedTupleStream:
         """
         Caution: Loads all elements into memory to determine uniqueness.
         """
-        self._stream = unique_everseen(self._stream)
-        return self
+        return self._add_op("unique")
 
     def sort(
         self, key: Optional[Callable] = None, reverse: bool = True
@@ -111,26 +624,22 @@ class NamedTupleStream(GenericStream[NamedTuple]):
         """
         Caution: Loads all elements into memory to perform sorting.
         """
-        self._stream = (i for i in sorted(self._stream, key=key, reverse=reverse))
-        return self
+        return self._add_op("sort", key=key, reverse=reverse)
 
     def top(self, num: int, attr: str, unique: bool = True) -> NamedTupleStream:
-        self._stream = sort_n(
-            self._stream, num=num, key=attrgetter(attr), reverse=True, unique=unique
-        )
         # todo: move into generic stream
-        return self
+        return self._add_op("top", num=num, attr=attr, unique=unique)
 
     def filter(
         self, predicate: Callable, max_tail_skip: Optional[int] = None
     ) -> NamedTupleStream:
+        """
+        Filters are applied to each feed, where max_tail_skip stops a feed once it is
+        past the elements that match (see _filter). Chained after limit or top they can
+        only be applied to the whole stream, and max_tail_skip is ignored (with a warning).
+        """
         # todo: move into generic stream
-        filter_partial = partial(
-            self._filter, predicate=predicate, max_tail_skip=max_tail_skip
-        )
-        self._stream_muxer.map_streams(filter_partial)
-
-        return self
+        return self._add_op("filter", predicate=predicate, max_tail_skip=max_tail_skip)
 
     def filter_range(
         self,
@@ -175,6 +684,20 @@ class NamedTupleStream(GenericStream[NamedTuple]):
             max_tail_skip=max_tail_skip,
         )
 
+    def recent(
+        self, attr: str = "created_at", max_tail_skip: Optional[int] = 50, **duration
+    ) -> NamedTupleStream:
+        """
+        Filter elements created in the last duration, e.g. recent(hours=24).
+        Like created_range, each feed stops once it is past the cutoff.
+        :param duration: pendulum duration e.g. days, hours, minutes
+        """
+        return self.filter_range(
+            attr=attr,
+            gte=pendulum.now("UTC").subtract(**duration),
+            max_tail_skip=max_tail_skip,
+        )
+
     @staticmethod
     def _filter(
         stream: Iterator[Any], predicate: Callable, max_tail_skip: Optional[int] = 50
@@ -190,6 +713,7 @@ class NamedTupleStream(GenericStream[NamedTuple]):
 
         if not max_tail_skip:
             yield from filter(predicate, stream)
+            return
 
         stream = dropwhile(lambda x: not predicate(x), stream)
 
@@ -207,20 +731,106 @@ class NamedTupleStream(GenericStream[NamedTuple]):
     def save_csv(
         self, file_name: str, header_row: Optional[Sequence[str]] = None
     ) -> NamedTupleStream:
+        """
+        Save elements to csv as they are streamed.
+        """
         # todo: move into generic stream
+        return self._add_op("save_csv", file_name=file_name, header_row=header_row)
+
+    @staticmethod
+    def _save_csv(
+        stream: Iterator[NamedTuple],
+        file_name: str,
+        header_row: Optional[Sequence[str]] = None,
+    ) -> Iterator[NamedTuple]:
         with open(file_name, "w", newline="", encoding="utf-8") as csv_file:
             # using newline='' corrects empty lines
             writer = csv.writer(csv_file)
 
-            for i in self:
+            for i in stream:
+                row, fields = i, i._fields
+                if isinstance(i, InstagramMedia):
+                    # the post's columns, followed by the media ones
+                    row, fields = (*i.post, *i[1:]), (*i.post._fields, *i._fields[1:])
                 if not header_row:
-                    header_row = i._fields
+                    header_row = fields
                     writer.writerow(header_row)
-                writer.writerow(i)
+                writer.writerow(row)
                 yield i
 
+    @staticmethod
+    def _download_media(
+        stream: Iterator[NamedTuple], directory: str, concurrency: int, url_attr: str
+    ) -> Iterator[NamedTuple]:
+        """
+        Download media with a pool of workers while the stream keeps being crawled.
+        At most concurrency * 2 elements are held back waiting for their download,
+        elements are yielded in order as InstagramMedia, with media_path set, or
+        media_error if the download failed.
+        """
+        os.makedirs(directory, exist_ok=True)
+        # file path -> download, so that duplicates in flight are downloaded once
+        in_flight = {}
+        pending = deque()
+
+        def done(e: NamedTuple, path: Optional[str], future: Optional[Future]):
+            if not future:
+                return InstagramMedia(e)
+            if in_flight.get(path) is future:
+                del in_flight[path]
+            try:
+                return InstagramMedia(e, media_path=future.result())
+            except (OSError, HTTPException) as err:
+                logger.warning("Failed to download %s: %r", path, err)
+                return InstagramMedia(e, media_error=repr(err))
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            for e in stream:
+                url = getattr(e, url_attr)
+                path = future = None
+                if url:
+                    path = media_file_path(directory, url, e.shortcode)
+                    future = in_flight.get(path)
+                    if not future:
+                        future = executor.submit(download_file, url, path)
+                        in_flight[path] = future
+                pending.append((e, path, future))
+                if len(pending) >= concurrency * 2:
+                    yield done(*pending.popleft())
+            while pending:
+                yield done(*pending.popleft())
+
+    @staticmethod
+    def _sort(
+        stream: Iterator[NamedTuple], key: Optional[Callable], reverse: bool
+    ) -> Iterator[NamedTuple]:
+        # generator so that sorting waits until iteration
+        yield from sorted(stream, key=key, reverse=reverse)
+
+    @staticmethod
+    def _top(
+        stream: Iterator[NamedTuple], num: int, attr: str, unique: bool
+    ) -> Iterator[NamedTuple]:
+        yield from sort_n(
+            stream, num=num, key=attrgetter(attr), reverse=True, unique=unique
+        )
+
 
 class ThumbStream(NamedTupleStream[InstagramPostThumb]):
+    def download_media(self, directory: str, concurrency: int = 8) -> ThumbStream:
+        """
+        Download each thumb's image into directory as the stream runs, thumbs are then
+        streamed as InstagramMedia, with the path of their image.
+        Files are named by shortcode, those already downloaded are skipped.
+        Filters chained after this run before it, so they can't test media_path.
+        """
+        return self._add_op(
+            "download_media",
+            directory=directory,
+            concurrency=concurrency,
+            url_attr="img_url",
+        )
+
     def post_stream(self):
         raise NotImplementedError
 
@@ -233,6 +843,20 @@ class ThumbStream(NamedTupleStream[InstagramPostThumb]):
 
 
 class PostStream(NamedTupleStream[InstagramPost]):
+    def download_media(self, directory: str, concurrency: int = 8) -> PostStream:
+        """
+        Download each post's image into directory as the stream runs, posts are then
+        streamed as InstagramMedia, with the path of their image.
+        Files are named by shortcode, those already downloaded are skipped.
+        Filters chained after this run before it, so they can't test media_path.
+        """
+        return self._add_op(
+            "download_media",
+            directory=directory,
+            concurrency=concurrency,
+            url_attr="display_url",
+        )
+
     def thumb_stream(self):
         raise NotImplementedError
 
@@ -242,8 +866,13 @@ class PostStream(NamedTupleStream[InstagramPost]):
     def location_stream(self):
         raise NotImplementedError
 
-    def comment_stream(self):
-        raise NotImplementedError
+    def comment_stream(self, concurrency: int = 4) -> CommentStream:
+        """
+        Stream of comments, <post 1 comments>, <post 2 comments>, etc.
+        Comments of several posts are fetched at once, apply per-post limits and
+        cutoffs (limit_each, recent, created_range) to the returned stream.
+        """
+        return self._iis.comments(self, concurrency=concurrency)
 
     def photo_user_stream(self):
         """
@@ -261,6 +890,15 @@ class UserStream(NamedTupleStream[InstagramUser]):
         raise NotImplementedError
 
 
+class UserThumbStream(NamedTupleStream[InstagramUserThumb]):
+    def user_stream(self) -> UserStream:
+        return self._iis.users(self)
+
+
+class FollowStream(NamedTupleStream[InstagramFollow]):
+    pass
+
+
 class CommentStream(NamedTupleStream[InstagramComment]):
     def owner_stream(self):
         raise NotImplementedError
@@ -5,6 +5,12 @@ from typing import Iterator, Any, Optional, Callable, Sequence, Union
 import pendulum
 from more_itertools import take
 
+try:
+    # optional, much faster decoding of large feed pages
+    import orjson as _json
+except ImportError:
+    import json as _json
+
 
 # todo: move more functions from stream to here
 
@@ -32,7 +38,7 @@ def sort_n(
         if not buffer:
             return results
         if unique:
-            buffer = set(buffer)
+            buffer = set(buffer).difference(results)
         results.extend(buffer)
         results = sorted(results, key=key, reverse=reverse)[:num]
 
@@ -47,6 +53,46 @@ def _get_datetime(d: Union[int, str, datetime, pendulum.datetime]) -> pendulum.d
     return d
 
 
+def _json_loads(s: Union[str, bytes]) -> Any:
+    return _json.loads(s)
+
+
+def _dig(data: Any, *path: Union[str, int], default=None) -> Any:
+    """
+    Follow a path of keys/indexes into decoded json without copying anything.
+    Missing or null steps return default, so callers only touch the fields they use.
+    :param data: decoded json
+    :param path: keys (dicts) or indexes (lists)
+    :param default: returned if any step of the path is missing or null
+    :return: value at the end of the path
+    """
+    for p in path:
+        try:
+            data = data[p]
+        except (KeyError, IndexError, TypeError):
+            return default
+        if data is None:
+            return default
+    return data
+
+
+_shortcode_alphabet = "ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_"
+
+
+def _post_id_to_shortcode(post_id: Union[int, str]) -> str:
+    """
+    Shortcodes are base64 encoded post ids
+    :param post_id: e.g. 1950000000000000000 or 1950000000000000000_123456 (owner id)
+    :return: shortcode
+    """
+    post_id = int(str(post_id).split("_")[0])
+    shortcode = ""
+    while post_id:
+        post_id, i = divmod(post_id, 64)
+        shortcode = _shortcode_alphabet[i] + shortcode
+    return shortcode
+
+
 def _to_int(val, default=None) -> Optional[int]:
     try:
         return int(val)
@@ -68,11 +114,8 @@ def _timestamp_to_datetime(val, default=None) -> Union[pendulum.datetime, None]:
         return default
 
 
-def _get_caption(data) -> str:
-    try:
-        return data.edge_media_to_caption.edges[0].node.text or ""
-    except IndexError:
-        return ""
+def _get_caption(data: dict) -> str:
+    return _dig(data, "edge_media_to_caption", "edges", 0, "node", "text") or ""
 
 
 # https://gist.github.com/mahmoud/237eb20108b5805aed5f
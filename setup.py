@@ -8,6 +8,7 @@ setup(
     version='0.1.0',
     packages=find_packages(),
     install_requires=REQUIRES,
+    extras_require={'fast': ['orjson']},
     url='https://github.com/isaacimholt/InstagramInfiniteScraper',
     license='MIT License',
     author='Isaac Imholt',
@@ -0,0 +1,81 @@
+import time
+
+import pytest
+
+from instagram_web_api.errors import ClientError
+
+from instagram_is import InstagramIS
+
+# 2018-12-02 17:00 utc, feeds go back in time one element per minute from here
+NOW = 1543770000
+
+
+class FakeClient:
+    """
+    Stands in for the web api client: every feed has `total` elements, numbered from
+    the most recent, and every call is recorded in `calls`.
+    """
+
+    def __init__(self, total=100, delay=0):
+        self.total = total
+        # seconds each call takes, e.g. to let feeds read concurrently overlap
+        self.delay = delay
+        self.calls = []
+
+    def _page(self, feed_id, count, end_cursor, node):
+        start = int(end_cursor or 0)
+        n = min(count, self.total - start)
+        return {
+            "page_info": {
+                "has_next_page": start + n < self.total,
+                "end_cursor": str(start + n),
+            },
+            "edges": [{"node": node(feed_id, i)} for i in range(start, start + n)],
+        }
+
+    @staticmethod
+    def _post(location_id, i):
+        return {
+            "id": str(location_id * 1000 + i),
+            "shortcode": f"{location_id}_{i}",
+            "owner": {"id": str(i % 10)},
+            "taken_at_timestamp": NOW - i * 60,
+            "edge_media_preview_like": {"count": i % 7},
+            "edge_media_to_comment": {"count": 1},
+            "display_url": f"https://cdn.example.com/{location_id}/{i}.jpg",
+        }
+
+    def location_feed(self, location_id, count=16, end_cursor=None):
+        self.calls.append(("location_feed", location_id, count, end_cursor))
+        media = self._page(location_id, count, end_cursor, self._post)
+        return {"data": {"location": {"edge_location_to_media": media}}}
+
+    @staticmethod
+    def _comment(shortcode, i):
+        return {
+            "id": str(i),
+            "text": f"comment {i} #tag @user{i % 3}",
+            "created_at": NOW - i * 60,
+            "owner": {"id": str(i % 10), "username": f"user{i % 10}"},
+        }
+
+    def media_comments(self, short_code, count=16, end_cursor=None, extract=True):
+        self.calls.append(("media_comments", short_code, count, end_cursor))
+        time.sleep(self.delay)
+        if short_code == "deleted":
+            raise ClientError("Not Found", 404)
+        comments = self._page(short_code, count, end_cursor, self._comment)
+        return {"data": {"shortcode_media": {"edge_media_to_comment": comments}}}
+
+
+@pytest.fixture
+def client(request):
+    # FakeClient arguments can be set with indirect parametrization
+    return FakeClient(**getattr(request, "param", {}))
+
+
+@pytest.fixture
+def iis(client):
+    iis = object.__new__(InstagramIS)
+    iis._web_api_client = client
+    return iis
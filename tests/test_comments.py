@@ -0,0 +1,96 @@
+import threading
+
+import pendulum
+import pytest
+
+from conftest import NOW
+from instagram_is.models import InstagramComment, InstagramPostThumb
+
+POSTS = ["a", "b", "c", "d", "e"]
+
+
+def test_comment_model(iis):
+    c = iis.comment_feed("a").limit(1).to_list()[0]
+    assert c.comment_id == 0
+    assert c.post_shortcode == "a"
+    assert c.owner_username == "user0"
+    assert c.hashtags == ("tag",)
+    assert c.mentions == ("user0",)
+    assert c.created_at.int_timestamp == NOW
+
+
+@pytest.mark.parametrize("client", [{"total": 60, "delay": 0.02}], indirect=True)
+def test_concurrent_feeds_keep_order(iis):
+    comments = iis.comment_feed(POSTS, concurrency=4).to_list()
+    assert [(c.post_shortcode, c.comment_id) for c in comments] == [
+        (s, i) for s in POSTS for i in range(60)
+    ]
+
+
+@pytest.mark.parametrize("client", [{"total": 10}], indirect=True)
+def test_concurrent_feeds_overlap(iis, client):
+    # only passes if every post is being fetched at the same time
+    barrier = threading.Barrier(len(POSTS), timeout=10)
+    media_comments = client.media_comments
+
+    def wait_for_all(short_code, **kwargs):
+        barrier.wait()
+        return media_comments(short_code, **kwargs)
+
+    client.media_comments = wait_for_all
+    assert len(iis.comment_feed(POSTS, concurrency=len(POSTS)).to_list()) == 50
+
+
+@pytest.mark.parametrize("client", [{"total": 10_000}], indirect=True)
+def test_first_comment_does_not_wait_for_whole_threads(iis, client):
+    stream = iis.comment_feed(POSTS, concurrency=4)
+    stream = stream.filter(lambda c: c.comment_id % 2)
+    stream.log_progress = None
+    assert next(iter(stream)).comment_id == 1
+    # each worker reads at most a page or two ahead
+    assert len(client.calls) <= 4 * 3
+
+
+@pytest.mark.parametrize("client", [{"total": 10_000, "delay": 0.01}], indirect=True)
+def test_closing_stream_stops_workers(iis, client):
+    before = set(threading.enumerate())
+    stream = iis.comment_feed(POSTS, concurrency=4)
+    stream.log_progress = None
+    it = iter(stream)
+    assert [next(it) for _ in range(3)]
+    workers = set(threading.enumerate()) - before
+    assert workers
+    it.close()
+    calls = len(client.calls)
+    # reading every feed to the end would take far longer than this
+    for worker in workers:
+        worker.join(timeout=5)
+        assert not worker.is_alive()
+    # at most the page each worker was fetching when the stream was closed
+    assert len(client.calls) <= calls + len(workers)
+
+
+def test_limit_each_sizes_comment_pages(iis, client):
+    comments = iis.comment_feed(POSTS, concurrency=3).limit_each(5).to_list()
+    assert len(comments) == 25
+    assert sorted(c[1:] for c in client.calls) == [(s, 5, None) for s in POSTS]
+
+
+def test_recent_stops_each_post(iis, client, monkeypatch):
+    monkeypatch.setattr(pendulum, "now", lambda tz=None: pendulum.from_timestamp(NOW))
+    comments = iis.comment_feed(POSTS, concurrency=3).recent(minutes=10).to_list()
+    assert len(comments) == 5 * 11
+    # each post stops 50 comments past the cutoff, on its second page
+    assert len(client.calls) == 5 * 2
+
+
+def test_deleted_post_is_skipped(iis):
+    comments = iis.comment_feed(["a", "deleted", "b"], concurrency=2).to_list()
+    assert {c.post_shortcode for c in comments} == {"a", "b"}
+
+
+def test_comments_accepts_models(iis, client):
+    thumb = InstagramPostThumb(*[None] * 13)._replace(shortcode="a")
+    comment = InstagramComment(*[None] * 9)._replace(post_shortcode="b")
+    iis.comments([thumb, comment], "c").limit_each(1).run()
+    assert [c[1] for c in client.calls] == ["a", "b", "c"]
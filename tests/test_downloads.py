@@ -0,0 +1,121 @@
+import csv
+import http.server
+import re
+import threading
+from http.client import IncompleteRead
+
+import pytest
+
+import instagram_is.streams
+from conftest import NOW
+from instagram_is.downloads import download_file, media_file_path
+from instagram_is.models import InstagramMedia, InstagramPostThumb
+
+DATA = bytes(range(256)) * 400
+
+
+@pytest.fixture
+def server():
+    """
+    Serves DATA, honouring range requests; the first response is cut short.
+    """
+    requests = []
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            m = re.match(r"bytes=(\d+)-", self.headers.get("Range", ""))
+            start = int(m.group(1)) if m else 0
+            requests.append(start)
+            body = DATA[start:]
+            self.send_response(206 if m else 200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            if len(requests) == 1:
+                body = body[: len(body) // 2]
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    srv = http.server.HTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=srv.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{srv.server_port}/media/a.jpg", requests
+    srv.shutdown()
+
+
+def test_truncated_download_is_resumed(server, tmp_path):
+    url, requests = server
+    path = download_file(url, str(tmp_path / "a.jpg"))
+    assert open(path, "rb").read() == DATA
+    assert requests == [0, len(DATA) // 2]
+
+
+def test_existing_files_are_skipped(server, tmp_path):
+    url, requests = server
+    path = tmp_path / "a.jpg"
+    path.write_bytes(b"done")
+    assert download_file(url, str(path)) == str(path)
+    assert requests == []
+
+
+def test_media_file_path_ignores_url_signature(tmp_path):
+    a = media_file_path("d", "https://cdn.example.com/a/b.mp4?sig=1")
+    assert a == media_file_path("d", "https://cdn.example.com/a/b.mp4?sig=2")
+    assert a.endswith(".mp4")
+    assert media_file_path("d", "https://cdn.example.com/a/b.jpg", "Bq1") == "d/Bq1.jpg"
+
+
+@pytest.fixture
+def downloads(monkeypatch):
+    urls = []
+
+    def fake_download(url, path):
+        urls.append(url)
+        if url.endswith("/13.jpg"):
+            raise IncompleteRead(b"")
+        return path
+
+    monkeypatch.setattr(instagram_is.streams, "download_file", fake_download)
+    return urls
+
+
+def test_filter_runs_before_download(iis, client, downloads, tmp_path):
+    stream = (
+        iis.location_feed([1])
+        .download_media(str(tmp_path))
+        .created_range(NOW - 20 * 60, NOW - 10 * 60)
+    )
+    posts = stream.to_list()
+    assert [p.shortcode for p in posts] == [f"1_{i}" for i in range(10, 21)]
+    assert len(downloads) == 11
+    # the feed still stops once it is past the range
+    assert len(client.calls) == 2
+
+
+def test_failed_download_is_recorded(iis, downloads, tmp_path):
+    posts = iis.location_feed([1]).download_media(str(tmp_path)).limit(20).to_list()
+    assert len(posts) == 20
+    failed = [p for p in posts if p.media_error]
+    assert [p.shortcode for p in failed] == ["1_13"]
+    assert failed[0].media_path is None
+    assert all(p.media_path for p in posts if p is not failed[0])
+
+
+def test_media_is_streamed_alongside_posts(iis, downloads, tmp_path):
+    posts = iis.location_feed([1]).limit(3).to_list()
+    media = iis.location_feed([1]).download_media(str(tmp_path)).limit(3).to_list()
+    assert all(isinstance(m, InstagramMedia) for m in media)
+    assert [m.post for m in media] == posts
+    assert [m.engagement for m in media] == [p.engagement for p in posts]
+
+
+def test_save_csv_columns(iis, downloads, tmp_path):
+    plain, media = str(tmp_path / "plain.csv"), str(tmp_path / "media.csv")
+    iis.location_feed([1]).limit(3).save_csv(plain).run()
+    iis.location_feed([1]).download_media(str(tmp_path)).limit(3).save_csv(media).run()
+    with open(plain) as fh:
+        assert next(csv.reader(fh)) == list(InstagramPostThumb._fields)
+    with open(media) as fh:
+        rows = list(csv.reader(fh))
+    assert rows[0] == [*InstagramPostThumb._fields, "media_path", "media_error"]
+    assert len(rows) == 4 and all(len(r) == len(rows[0]) for r in rows)
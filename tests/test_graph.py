@@ -0,0 +1,119 @@
+import os
+
+import pytest
+
+from instagram_is import graph
+from instagram_is.graph import DiskFrontier, GraphEdge, IdLog, VisitedIds, crawl_graph
+
+
+def neighbours(node_id, max_results=None):
+    # every node links to three others, so the graph has cycles and shared neighbours
+    return iter([(node_id * 3 + k) % 50 for k in (1, 2, 3)])
+
+
+def test_visited_ids_merges_buffer():
+    visited = VisitedIds([5, 1, 5], buffer_size=3)
+    for i in (9, 3, 1, 2**63):
+        visited.add(i)
+    assert len(visited) == 5
+    assert all(i in visited for i in (1, 3, 5, 9, 2**63))
+    assert 4 not in visited and 0 not in visited
+
+
+def test_visited_ids_save_load(tmp_path):
+    path = str(tmp_path / "visited.bin")
+    visited = VisitedIds(range(0, 100, 7))
+    visited.add(1000)
+    visited.save(path)
+    loaded = VisitedIds.load(path)
+    assert len(loaded) == len(visited)
+    assert all(i in loaded for i in list(range(0, 100, 7)) + [1000])
+    assert os.path.getsize(path) == len(visited) * VisitedIds.itemsize
+
+
+def test_disk_frontier_is_fifo_and_resumes(tmp_path):
+    path = str(tmp_path / "frontier.bin")
+    frontier = DiskFrontier(path)
+    for i in range(5):
+        frontier.push(i, i % 2)
+    assert frontier.pop() == (0, 0)
+    read_offset, size = frontier.read_offset, frontier.size
+    # pushed after the checkpoint, dropped when reopening
+    frontier.push(99, 1)
+    frontier.close()
+
+    frontier = DiskFrontier(path, read_offset=read_offset, size=size)
+    assert len(frontier) == 4
+    assert [frontier.pop() for _ in range(4)] == [(1, 1), (2, 0), (3, 1), (4, 0)]
+    with pytest.raises(IndexError):
+        frontier.pop()
+    frontier.close()
+
+
+def test_id_log_appends_and_truncates(tmp_path):
+    path = str(tmp_path / "visited.log")
+    log = IdLog(path)
+    for i in range(250_000):
+        log.append(i)
+    size = log.size
+    log.append(2**64 - 1)
+    assert list(log)[-2:] == [249_999, 2**64 - 1]
+    log.close()
+
+    log = IdLog(path, size=size)
+    assert len(log) == 250_000
+    assert list(log) == list(range(250_000))
+    log.close()
+
+
+def full_crawl(tmp_path):
+    return list(crawl_graph(neighbours, [0, 1], str(tmp_path / "full"), max_depth=3))
+
+
+def test_crawl_graph_stays_within_depth(tmp_path):
+    edges = full_crawl(tmp_path)
+    assert edges[0] == GraphEdge(0, 1, 0)
+    assert {e.depth for e in edges} == {0, 1, 2}
+    # every node is crawled once
+    sources = [e.source_id for e in edges]
+    assert len(sources) == 3 * len(set(sources))
+
+
+@pytest.mark.parametrize("compact_bytes", [graph._COMPACT_MIN_BYTES, 0])
+def test_crawl_graph_resumes(tmp_path, monkeypatch, compact_bytes):
+    monkeypatch.setattr(graph, "_COMPACT_MIN_BYTES", compact_bytes)
+    expected = full_crawl(tmp_path)
+    state_dir = str(tmp_path / "state")
+
+    crawl = crawl_graph(neighbours, [0, 1], state_dir, max_depth=3, checkpoint_every=2)
+    # stop in the middle of the third node
+    first = [next(crawl) for _ in range(8)]
+    crawl.close()
+    # seeds are ignored when resuming
+    resumed = list(crawl_graph(neighbours, [42], state_dir, max_depth=3))
+
+    assert set(first + resumed) == set(expected)
+    # only the interrupted node is crawled again
+    assert resumed[0] == GraphEdge(first[6].source_id, first[6].target_id, 1)
+    assert len(first) + len(resumed) == len(expected) + 2
+
+    # the visited log is folded into a snapshot when it outgrows it
+    files = sorted(f for f in os.listdir(state_dir) if f.startswith("visited"))
+    if compact_bytes:
+        assert files == ["visited-0.log"]
+    else:
+        assert len(files) == 2 and files[0] != "visited-0.bin"
+
+
+def test_state_dir_is_locked_while_crawling(tmp_path):
+    state_dir = str(tmp_path / "state")
+    crawl = crawl_graph(neighbours, [0], state_dir, max_depth=3)
+    first = [next(crawl) for _ in range(4)]
+    with pytest.raises(RuntimeError):
+        next(crawl_graph(neighbours, [0], state_dir, max_depth=3))
+    # the first crawl was left untouched
+    rest = list(crawl)
+    expected = crawl_graph(neighbours, [0], str(tmp_path / "full"), max_depth=3)
+    assert first + rest == list(expected)
+    # and the lock is released once it is done
+    assert list(crawl_graph(neighbours, [0], state_dir, max_depth=3)) == []
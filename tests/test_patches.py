@@ -0,0 +1,97 @@
+import inspect
+import json
+import threading
+import time
+from http.client import IncompleteRead
+from socket import timeout
+
+import pytest
+from instagram_web_api import Client
+from instagram_web_api.errors import ClientConnectionError
+
+from conftest import FakeClient
+from instagram_is import InstagramIS, patches
+from instagram_is.patches import CustomWebApiClient
+
+# without the rate limit & retries
+make_request = inspect.unwrap(CustomWebApiClient._make_request)
+
+
+class FakeResponse:
+    def __init__(self, body=b"", error=None):
+        self.body = body
+        self.error = error
+
+    def info(self):
+        return {}
+
+    def read(self):
+        if self.error:
+            raise self.error
+        return self.body
+
+
+@pytest.fixture
+def client(monkeypatch):
+    def respond(response):
+        monkeypatch.setattr(Client, "_make_request", lambda *a, **kw: response)
+        return object.__new__(CustomWebApiClient)
+
+    return respond
+
+
+def test_decodes_json(client):
+    c = client(FakeResponse(b'{"data": {"count": 1}}'))
+    assert make_request(c, "https://www.instagram.com") == {"data": {"count": 1}}
+
+
+def test_returns_response(client):
+    response = FakeResponse()
+    c = client(response)
+    assert (
+        make_request(c, "https://www.instagram.com", return_response=True) is response
+    )
+
+
+@pytest.mark.parametrize("error", [timeout("timed out"), IncompleteRead(b"{")])
+def test_body_read_errors_are_client_errors(client, error):
+    # ClientError is what the client retries on
+    c = client(FakeResponse(error=error))
+    with pytest.raises(ClientConnectionError):
+        make_request(c, "https://www.instagram.com")
+
+
+def test_concurrent_feeds_share_rate_limit(monkeypatch):
+    # the real retry & rate limit stack, with a shorter period
+    monkeypatch.setattr(patches._throttle, "period", 0.01)
+    monkeypatch.setattr(patches._throttle, "jitter", 0)
+    fake = FakeClient(total=100)
+    calls, lock = [], threading.Lock()
+
+    def request(client, url, query=None, return_response=False):
+        variables = json.loads(query["variables"])
+        with lock:
+            calls.append(time.monotonic())
+        comments = fake._page(
+            variables["shortcode"],
+            variables["first"],
+            variables.get("after"),
+            fake._comment,
+        )
+        body = {"data": {"shortcode_media": {"edge_media_to_comment": comments}}}
+        return FakeResponse(json.dumps(body).encode())
+
+    monkeypatch.setattr(Client, "_make_request", request)
+    client = object.__new__(CustomWebApiClient)
+    client.auto_patch = False
+    iis = object.__new__(InstagramIS)
+    iis._web_api_client = client
+
+    shortcodes = [f"post{i}" for i in range(8)]
+    stream = iis.comment_feed(shortcodes, concurrency=4)
+    stream.log_progress = None
+    # 8 feeds of 100 comments, two pages each
+    assert len(stream.to_list()) == 8 * 100
+    assert len(calls) == 8 * 2
+    # workers queue up for the next slot instead of giving up
+    assert all(b - a >= 0.01 for a, b in zip(calls, calls[1:]))
@@ -0,0 +1,108 @@
+import pytest
+
+from conftest import NOW
+from instagram_is.streams import NamedTupleStream, _Op
+
+# elements 10..40 of each feed, i.e. 31 per feed
+AFTER = NOW - 40 * 60
+BEFORE = NOW - 10 * 60
+
+
+def shortcodes(stream):
+    stream.log_progress = None
+    return [p.shortcode for p in stream]
+
+
+def test_limit_sizes_pages(iis, client):
+    assert len(iis.location_feed([1, 2, 3]).limit(5).to_list()) == 5
+    assert client.calls == [("location_feed", 1, 5, None)]
+
+
+def test_limit_is_shared_between_feeds(iis, client):
+    assert len(iis.location_feed([1, 2, 3]).limit(130).to_list()) == 130
+    assert [c[1:3] for c in client.calls] == [(1, 50), (1, 50), (2, 30)]
+
+
+def test_limit_each_sizes_pages(iis, client):
+    posts = iis.location_feed([1, 2]).limit_each(60).to_list()
+    assert len(posts) == 120
+    assert [c[1:3] for c in client.calls] == [(1, 50), (1, 10), (2, 50), (2, 10)]
+
+
+def test_limit_after_filter_does_not_size_pages(iis, client):
+    stream = iis.location_feed([1]).filter(lambda p: p.like_count > 3).limit(5)
+    assert len(stream.to_list()) == 5
+    assert client.calls == [("location_feed", 1, 50, None)]
+
+
+def test_filter_is_pushed_into_each_feed(iis, client):
+    stream = iis.location_feed([1, 2, 3]).unique().created_range(AFTER, BEFORE)
+    assert len(shortcodes(stream)) == 93
+    # each feed stops 50 elements past the range: 2 pages instead of all of them
+    assert len(client.calls) == 3 * 2
+
+
+def test_filter_after_limit_applies_to_whole_stream(iis, client):
+    stream = iis.location_feed([1, 2]).limit(20).created_range(AFTER, BEFORE)
+    with pytest.warns(UserWarning, match="max_tail_skip"):
+        assert len(stream.to_list()) == 10
+
+
+def test_filter_after_limit_each(iis):
+    stream = iis.location_feed([1, 2]).limit_each(20).created_range(AFTER, BEFORE)
+    assert shortcodes(stream) == [f"{f}_{i}" for f in (1, 2) for i in range(10, 20)]
+
+
+def test_limit_each_after_stream_operation(iis):
+    with pytest.raises(ValueError):
+        iis.location_feed([1]).unique().limit_each(3)
+
+
+def test_unique_top_fused():
+    ops = NamedTupleStream._fuse_ops(
+        [_Op("unique", {}), _Op("top", {"num": 3, "attr": "x", "unique": False})]
+    )
+    assert ops == [_Op("top", {"num": 3, "attr": "x", "unique": True})]
+
+
+def test_unique_top(iis):
+    stream = iis.location_feed([1, 1]).unique().top(3, "like_count", unique=False)
+    posts = stream.to_list()
+    assert [p.like_count for p in posts] == [6, 6, 6]
+    assert len(set(posts)) == 3
+
+
+def test_sort_waits_for_iteration(iis, client):
+    stream = iis.location_feed([1]).sort(key=lambda p: p.created_at, reverse=False)
+    assert not client.calls
+    assert shortcodes(stream.limit(1)) == ["1_99"]
+
+
+@pytest.mark.parametrize("path", [None, "posts.pickle"])
+def test_filter_after_materialize(iis, client, tmp_path, path):
+    path = path and str(tmp_path / path)
+    posts = iis.location_feed([1, 2, 3]).limit_each(100).materialize(path)
+    assert len(shortcodes(posts.copy().created_range(AFTER, BEFORE))) == 93
+    assert len(shortcodes(posts.copy().limit_each(10))) == 30
+    # nothing is fetched again
+    assert len(client.calls) == 6
+
+
+def test_materialize_after_stream_operation_is_one_feed(iis):
+    posts = iis.location_feed([1, 2, 3]).limit_each(100).top(50, "like_count")
+    assert len(shortcodes(posts.materialize().limit_each(10))) == 10
+
+
+def test_filter_after_tee(iis, client):
+    a, b = iis.location_feed([1, 2, 3]).limit_each(100).tee(2, max_buffer=1000)
+    a, b = a.created_range(AFTER, BEFORE), b.limit_each(10)
+    assert [len(shortcodes(s)) for s in (a, b)] == [93, 30]
+    assert len(client.calls) == 6
+
+
+def test_copy_streams_read_once(iis):
+    with pytest.raises(ValueError):
+        iis.comment_feed(["a", "b"]).copy()
+    with pytest.raises(ValueError):
+        iis.location_feed([1]).tee(2)[0].copy()
+    assert len(iis.location_feed([1]).limit(5).copy().to_list()) == 5